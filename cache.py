@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+
+# SQLite file holding Drive metadata between runs
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'drive_cache.sqlite')
+
+# How long (in seconds) a cached folder listing is trusted
+DEFAULT_TTL = 3600
+
+# Bumped whenever the tables change; older caches are dropped and rebuilt
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    mimeType TEXT,
+    createdTime TEXT,
+    modifiedTime TEXT,
+    size TEXT,
+    parents TEXT,
+    cached_at REAL NOT NULL,
+    PRIMARY KEY (parent, id)
+);
+CREATE INDEX IF NOT EXISTS files_by_id ON files (id);
+CREATE TABLE IF NOT EXISTS folders (
+    id TEXT PRIMARY KEY,
+    fields TEXT NOT NULL,
+    cached_at REAL NOT NULL
+);
+"""
+
+_initialized = False
+
+def _connect():
+    """Open a connection to the cache database, creating the tables on first use."""
+    global _initialized
+    conn = sqlite3.connect(CACHE_PATH)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            conn.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS folders;")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.executescript(SCHEMA)
+        _initialized = True
+    return conn
+
+def _field_set(fields):
+    """Split a field mask such as 'id, name, mimeType' into a set of field names."""
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+def get_children(parent_id, fields, ttl=DEFAULT_TTL):
+    """
+    Return the cached listing of a folder.
+    
+    Args:
+        parent_id: ID the folder was listed under (may be the 'root' alias)
+        fields: Field mask the caller needs, e.g. 'id, name, mimeType, size'
+        ttl: Maximum age of the listing in seconds
+        
+    Returns:
+        List of file dicts shaped like Drive's files.list results, or None if the
+        folder has no complete listing younger than ttl that was fetched with
+        (at least) the requested fields
+    """
+    cutoff = time.time() - ttl
+    with closing(_connect()) as conn:
+        folder = conn.execute(
+            "SELECT fields FROM folders WHERE id = ? AND cached_at > ?", (parent_id, cutoff)
+        ).fetchone()
+        if folder is None or not _field_set(fields) <= _field_set(folder['fields']):
+            return None
+        
+        rows = conn.execute(
+            "SELECT * FROM files WHERE parent = ? AND cached_at > ? ORDER BY rowid", (parent_id, cutoff)
+        ).fetchall()
+    
+    files = []
+    for row in rows:
+        file = {
+            'id': row['id'],
+            'name': row['name'],
+            'mimeType': row['mimeType'],
+            'parents': json.loads(row['parents']) if row['parents'] is not None else None,
+            'createdTime': row['createdTime'],
+            'modifiedTime': row['modifiedTime'],
+            'size': row['size']
+        }
+        files.append({key: value for key, value in file.items() if value is not None})
+    return files
+
+def put_children(parent_id, files, fields):
+    """
+    Store the complete listing of a folder, replacing any previous one.
+    
+    Args:
+        parent_id: ID the folder was listed under (may be the 'root' alias)
+        files: File dicts as returned by Drive's files.list
+        fields: Field mask the listing was fetched with
+    """
+    now = time.time()
+    rows = [
+        (
+            file['id'],
+            file.get('name', ''),
+            parent_id,
+            file.get('mimeType'),
+            file.get('createdTime'),
+            file.get('modifiedTime'),
+            file.get('size'),
+            json.dumps(file['parents']) if 'parents' in file else None,
+            now
+        )
+        for file in files
+    ]
+    
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM files WHERE parent = ?", (parent_id,))
+        conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)", (parent_id, fields, now))
+
+def find_child(parent_id, name, ttl=DEFAULT_TTL):
+    """Return the (ID, mimeType) of the item called name in a freshly cached folder.
+    
+    Returns None when there is no such item or the name isn't unique in the folder.
+    """
+    cutoff = time.time() - ttl
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT files.id, files.mimeType FROM files JOIN folders ON folders.id = files.parent "
+            "WHERE files.parent = ? AND files.name = ? AND folders.cached_at > ? ORDER BY files.rowid LIMIT 2",
+            (parent_id, name, cutoff)
+        ).fetchall()
+    return (rows[0]['id'], rows[0]['mimeType']) if len(rows) == 1 else None
+
+def invalidate_folder(folder_id):
+    """Forget the cached listing of a folder, e.g. after something was created in it."""
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+        conn.execute("DELETE FROM files WHERE parent = ?", (folder_id,))
+
+def invalidate_item(item_id):
+    """Forget an item that was moved or deleted, along with the listings it appeared in."""
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "DELETE FROM folders WHERE id = ? OR id IN (SELECT parent FROM files WHERE id = ?)",
+            (item_id, item_id)
+        )
+        conn.execute(
+            "DELETE FROM files WHERE parent = ? OR parent IN (SELECT parent FROM files WHERE id = ?)",
+            (item_id, item_id)
+        )
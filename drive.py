@@ -1,59 +1,290 @@
 import streamlit as st
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import Resource, build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+import asyncio
+import fnmatch
+import hashlib
 import json
 import logging
 import io
 import os
 import csv
+import codecs
+import httplib2
+import threading
+import time
+import traceback
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
 
 
-from langchain.agents import initialize_agent, AgentType
-from langchain_ollama import OllamaLLM
+from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_ollama import ChatOllama
 from langchain.agents import load_tools
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.tools import tool
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+import cache as metadata_cache
+from drive_common import PARENTS_PER_QUERY, deletion_order
+from rate_limiter import DriveRateLimiter, backoff_delay, is_retryable
+
+try:
+    from drive_async import AsyncDriveClient
+except ImportError:
+    # aiohttp is optional; without it bulk operations use batch requests only
+    AsyncDriveClient = None
 
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 # Define the scopes
 SCOPES = ['https://www.googleapis.com/auth/drive']
 
+# Formats Google Workspace files are exported to: Docs as plain text, Sheets as CSV, Slides as PDF
+EXPORT_MAP = {
+    'application/vnd.google-apps.document': 'text/plain',
+    'application/vnd.google-apps.spreadsheet': 'text/csv',
+    'application/vnd.google-apps.presentation': 'application/pdf'
+}
+
+# Where downloaded files and exported listings are saved, created on startup
+DOCUMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'documents')
+os.makedirs(DOCUMENTS_DIR, exist_ok=True)
+
+# Where the OAuth token is kept between runs
+TOKEN_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'drive-manager', 'token.json')
+
+# Calls per batch request. Drive accepts up to 100, but large batches
+# tend to come back with 500s, so stay well below that
+BATCH_SIZE = 25
+
+# Ollama model behind the Drive Agent tab; the 4-bit quantization roughly doubles tokens/s on CPU.
+# Keep in step with LLM_MODEL in model.py (not imported, to keep Chroma out of the app's imports)
+LLM_MODEL = "llama3.2:3b-instruct-q4_K_M"
+
+# Shared by every Drive call so bursts stay under the per-user quota
+limiter = DriveRateLimiter(rate=10, max_connections=8)
+
+# Leading bytes of the image formats shown as a preview in the View File tab
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+
+# Sizes of the DIB headers that follow the 14 byte header of a BMP file; "BM" alone is too
+# common at the start of other binary files to go by
+BMP_DIB_HEADER_SIZES = (12, 40, 52, 56, 64, 108, 124)
+
+# How much of a downloaded file is decoded for the text preview in the View File tab
+PREVIEW_BYTES = 1 << 20
+
+# The agent's view_file_content tool shows at most 2000 characters, which this covers
+# even when every character takes four bytes in UTF-8
+AGENT_PREVIEW_BYTES = 8 * 1024
+
+# mimeTypes view_file_content refuses without downloading anything
+BINARY_MIME_PREFIXES = ('image/', 'video/', 'audio/', 'application/octet-stream', 'application/zip')
+
+# Streamed downloads at least this big get their disk space preallocated
+PREALLOCATE_BYTES = 16 * 1024 * 1024
+
+# Size of each chunk yielded by get_file_content_stream, which holds one chunk in memory at a time
+STREAM_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Seconds between progress bar updates while a background download runs
+PROGRESS_INTERVAL = 0.2
+
+# Seconds between redraws of the Drive Agent tab while the agent works in the background
+AGENT_POLL_INTERVAL = 1
+
+# (parent, name) pairs OR-joined into one query when resolving many paths at once
+NAMES_PER_QUERY = 50
+
+# Most (parent, name) path segments remembered per session
+PATH_CACHE_SIZE = 4096
+
+# Seconds a path segment is trusted, so changes made outside the app show up eventually
+PATH_CACHE_TTL = 300
+
+# File fields list_files asks for unless the caller needs more (e.g. parents or size)
+LIST_FIELDS = 'id, name, mimeType, modifiedTime'
+
+# The Move File tab passes the parents on to move_file, and the View File tab uses the size to preallocate
+MOVE_LIST_FIELDS = LIST_FIELDS + ', parents'
+BROWSE_LIST_FIELDS = LIST_FIELDS + ', size'
+
+# mimeType prefixes behind the file types run_filtered_op can select; 'any' and 'file'
+# (anything but a folder) are handled separately
+FILE_TYPES = {
+    'folder': ('application/vnd.google-apps.folder',),
+    'image': ('image/',),
+    'video': ('video/',),
+    'audio': ('audio/',),
+    'pdf': ('application/pdf',),
+    'text': ('text/',),
+    'document': ('application/vnd.google-apps.document', 'application/msword',
+                 'application/vnd.openxmlformats-officedocument.wordprocessingml'),
+    'spreadsheet': ('application/vnd.google-apps.spreadsheet', 'text/csv', 'application/vnd.ms-excel',
+                    'application/vnd.openxmlformats-officedocument.spreadsheetml')
+}
+
+# Seconds before a Drive HTTP request times out
+HTTP_TIMEOUT = 30
+
+# Worker threads used for fanning out independent Drive calls
+DRIVE_WORKERS = 8
+
+# Per-thread HTTP connections for those workers
+_thread_local = threading.local()
+
+# Guards the path cache, which the agent's batch tool updates from worker threads
+_path_cache_lock = threading.Lock()
+
+@st.cache_resource
+def _load_client_config():
+    """Read and parse credentials.json once per process instead of on every rerun."""
+    with open('credentials.json') as f:
+        return json.load(f)
+
+def _load_saved_credentials():
+    """Return the credentials saved by a previous run, refreshed if needed, or None."""
+    if not os.path.exists(TOKEN_FILE):
+        return None
+    
+    creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+    if creds.valid:
+        return creds
+    
+    if creds.expired and creds.refresh_token:
+        try:
+            creds.refresh(Request())
+        except RefreshError as e:
+            logger.warning("Saved token could not be refreshed: %s", e)
+            return None
+        _save_credentials(creds)
+        return creds
+    
+    return None
+
+def _save_credentials(creds):
+    """Persist credentials so later runs can skip the browser OAuth flow."""
+    os.makedirs(os.path.dirname(TOKEN_FILE), mode=0o700, exist_ok=True)
+    # The file holds the refresh token and client secret, so only the owner may read it
+    fd = os.open(TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.chmod(TOKEN_FILE, 0o600)
+    with open(fd, 'w') as f:
+        f.write(creds.to_json())
+
 def authenticate():
     """Authenticate with Google Drive and return credentials"""
-    # Add authorization_prompt_message to make it clear what's happening
-    flow = InstalledAppFlow.from_client_secrets_file(
-        'credentials.json', 
-        SCOPES
-    )
+    # A saved (and possibly refreshed) token avoids the full OAuth flow
+    creds = _load_saved_credentials()
     
-    st.write("Starting OAuth flow...")
-    try:
-        # Use the run_local_server with more explicit parameters
-        creds = flow.run_local_server(
-            port=3000,
-            prompt='consent',  # Force re-consent to avoid cached state issues
-            authorization_prompt_message="Please complete authentication in your browser"
+    if creds is None:
+        # Add authorization_prompt_message to make it clear what's happening
+        flow = InstalledAppFlow.from_client_config(
+            _load_client_config(), 
+            SCOPES
         )
-        st.write("Authentication successful!")
-        
-        # Get tokens
-        token_info = {
-            "access_token": creds.token,
-            "refresh_token": creds.refresh_token,
-            "token_uri": creds.token_uri,
-            "client_id": creds.client_id,
-            "client_secret": creds.client_secret,
-            "scopes": creds.scopes
-        }
         
-        return creds, token_info
-    except Exception as e:
-        logging.error(f"Authentication error: {str(e)}")
-        raise RuntimeError(f"Authentication failed: {str(e)}. Try clearing your browser cookies and cache.")
+        st.write("Starting OAuth flow...")
+        try:
+            # Use the run_local_server with more explicit parameters
+            creds = flow.run_local_server(
+                port=3000,
+                prompt='consent',  # Force re-consent to avoid cached state issues
+                authorization_prompt_message="Please complete authentication in your browser"
+            )
+            st.write("Authentication successful!")
+        except Exception as e:
+            logger.error("Authentication error: %s", e)
+            raise RuntimeError(f"Authentication failed: {str(e)}. Try clearing your browser cookies and cache.")
+        
+        _save_credentials(creds)
+    
+    # Get tokens
+    token_info = {
+        "access_token": creds.token,
+        "refresh_token": creds.refresh_token,
+        "token_uri": creds.token_uri,
+        "client_id": creds.client_id,
+        "client_secret": creds.client_secret,
+        "scopes": creds.scopes
+    }
+    
+    return creds, token_info
+
+class _SharedHttp(AuthorizedHttp):
+    """AuthorizedHttp that several threads can share, since httplib2 itself isn't thread-safe.
+    
+    A request uses the shared connection when it's free; otherwise it goes out over the
+    calling thread's own connection instead of waiting, so concurrent calls stay concurrent.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+    
+    def request(self, *args, **kwargs):
+        if not self._lock.acquire(blocking=False):
+            return _thread_http(self.credentials).request(*args, **kwargs)
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            self._lock.release()
+
+def _new_http(creds):
+    """Create an authorized, keep-alive HTTP connection for Drive requests."""
+    return AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+
+@st.cache_resource(show_spinner=False)
+def _build_service(_creds, cache_key):
+    # Keep one authorized connection around so every call reuses the same TLS session.
+    # The discovery document bundled with the library is used, so building needs no network
+    # fetch, and cache_discovery=False skips the discovery cache lookup (and its warning)
+    http = _SharedHttp(_creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    return build('drive', 'v3', http=http, cache_discovery=False, static_discovery=True)
 
 def get_drive_service(creds):
+    """Build the Drive API service on top of a reusable, authorized HTTP connection.
+    
+    The service is cached per account across sessions and reruns, so a new browser
+    session reuses the existing one instead of building another.
+    
+    Args:
+        creds: Google OAuth credentials
+        
+    Returns:
+        Google Drive API service instance
+    """
+    cache_key = hashlib.sha256(f"{creds.client_id}:{creds.refresh_token}".encode()).hexdigest()
+    return _build_service(creds, cache_key)
+
+def _thread_http(credentials):
+    """Return an AuthorizedHttp owned by the current thread, since httplib2 connections aren't thread-safe."""
+    if getattr(_thread_local, 'credentials', None) is not credentials:
+        _thread_local.credentials = credentials
+        _thread_local.http = _new_http(credentials)
+    return _thread_local.http
+
+def create_folder(service, folder_name, parent_id=None):
+    """Create a folder in Google Drive.
+    
+    Args:
+        service: Google Drive API service instance
+        folder_name: Name of the folder to create
+        parent_id: (Optional) ID of the parent folder
+        
+    Returns:
+        ID of the created folder
+    """
     folder_metadata = {
         'name': folder_name,
         'mimeType': 'application/vnd.google-apps.folder'
@@ -63,281 +294,976 @@ def get_drive_service(creds):
     if parent_id:
         folder_metadata['parents'] = [parent_id]
         
-    print(f"Making API request to create folder: {json.dumps(folder_metadata, indent=2)}")
-    folder = service.files().create(body=folder_metadata, fields='id').execute()
-    print(f"API response: {json.dumps(folder, indent=2)}")
+    logger.debug("Creating folder %s", folder_metadata)
+    folder = limiter.call(service.files().create(body=folder_metadata, fields='id'))
     
     folder_id = folder.get('id')
-    print(f"Folder created with ID: {folder_id}")
+    logger.debug("Folder created with ID %s", folder_id)
+    
+    # The parent's cached listing no longer includes everything
+    metadata_cache.invalidate_folder(parent_id or 'root')
+    list_files.clear()
+    
+    # Drive allows siblings with the same name, so the path may now be ambiguous. Forget
+    # any cached sibling instead of caching the new folder, so the next lookup of this
+    # path asks Drive and raises if the name is no longer unique.
+    _cache_discard((parent_id or 'root', folder_name))
     
     return folder_id
 
-def create_folder(service, folder_name, parent_id=None):
-    """Create a folder in Google Drive.
+def create_folder_at_path(service, path):
+    """Create a folder at a Drive path such as '/Projects/2024/New Folder'.
+    
+    The parent folders must already exist. Resolving them takes one query at most
+    (none when they're cached), so the whole call usually costs two requests.
     
     Args:
         service: Google Drive API service instance
-        folder_name: Name of the folder to create
-        parent_id: (Optional) ID of the parent folder
+        path: Slash separated path of the folder to create, from the root of My Drive
         
     Returns:
         ID of the created folder
     """
-    folder_metadata = {
-        'name': folder_name,
-        'mimeType': 'application/vnd.google-apps.folder'
-    }
+    parent_path, _, folder_name = path.strip('/').rpartition('/')
+    if not folder_name:
+        raise ValueError("A folder name is required")
+    
+    parent_id, parent_mime = resolve_path(service, parent_path)
+    if parent_mime != 'application/vnd.google-apps.folder':
+        raise NotADirectoryError(f"'{parent_path}' is not a folder")
+    
+    return create_folder(service, folder_name, parent_id)
+
+def _create_document_file(filename):
+    """
+    Create a new, empty file in the documents folder, numbering the name if it's taken.
+    
+    Args:
+        filename: Name to save the file as
+        
+    Returns:
+        (path, fd) of the created file, open for writing
+    """
+    # Clean filename to avoid path traversal issues
+    safe_filename = os.path.basename(filename)
+    base_name, extension = os.path.splitext(safe_filename)
+    
+    # If file exists, append a number to avoid overwriting. One directory listing
+    # replaces a stat call per taken name.
+    existing = {entry.name for entry in os.scandir(DOCUMENTS_DIR)}
+    candidate = safe_filename
+    counter = 0
+    while True:
+        while candidate in existing:
+            counter += 1
+            candidate = f"{base_name}_{counter}{extension}"
+        
+        # Create full path. O_EXCL claims the name atomically, in case another save took it in the meantime.
+        file_path = os.path.join(DOCUMENTS_DIR, candidate)
+        try:
+            return file_path, os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            existing.add(candidate)
+
+def _preallocate(f, size):
+    """Reserve the space for a big download up front so the filesystem doesn't have to grow the file chunk by chunk."""
+    if size and int(size) >= PREALLOCATE_BYTES and hasattr(os, 'posix_fallocate'):
+        os.posix_fallocate(f.fileno(), 0, int(size))
+
+def save_file_to_documents(content, filename, size=None):
+    """
+    Save file content to the documents folder in the same directory.
+    
+    Args:
+        content: File content as bytes or str, or an iterable of byte chunks
+        filename: Name to save the file as
+        size: (Optional) Expected size in bytes of streamed content, used to preallocate large files
+        
+    Returns:
+        Path where the file was saved
+    """
+    file_path, fd = _create_document_file(filename)
+    
+    # Save the file
+    if isinstance(content, (bytes, str)):
+        mode = 'wb' if isinstance(content, bytes) else 'w'
+        with open(fd, mode) as f:
+            f.write(content)
+    else:
+        # Write streamed chunks as they arrive so the whole file is never held in memory
+        try:
+            with open(fd, 'wb') as f:
+                _preallocate(f, size)
+                
+                for chunk in content:
+                    f.write(chunk)
+                
+                # Drop any preallocated space the content didn't fill
+                f.truncate()
+        except Exception:
+            # Don't leave a partial file behind if the download fails
+            os.remove(file_path)
+            raise
+    
+    return file_path
+
+@st.cache_resource(show_spinner=False)
+def _background_loop():
+    """Start the event loop that background downloads run on, once per process."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='drive-downloads', daemon=True).start()
+    return loop
+
+def download_in_background(async_client, file_id, file_name, size=None):
+    """
+    Download a regular (non Google Workspace) file into the documents folder on the
+    background event loop, showing its progress while it runs.
+    
+    Args:
+        async_client: AsyncDriveClient to download with
+        file_id: ID of the file
+        file_name: Name to save the file as
+        size: (Optional) Size in bytes of the file, used for the progress bar and preallocation
+        
+    Returns:
+        Path where the file was saved
+    """
+    file_path, fd = _create_document_file(file_name)
+    progress_bar = st.progress(0.0) if size else None
+    written = 0
+    
+    def progress(count):
+        nonlocal written
+        written = count
+    
+    future = None
+    try:
+        with open(fd, 'wb') as f:
+            _preallocate(f, size)
+            future = asyncio.run_coroutine_threadsafe(
+                async_client.download_file(file_id, f, progress=progress),
+                _background_loop()
+            )
+            
+            # The download runs on the loop's thread; this thread only keeps the progress bar current
+            while True:
+                try:
+                    future.result(timeout=PROGRESS_INTERVAL)
+                    break
+                except FutureTimeoutError:
+                    if progress_bar is not None:
+                        progress_bar.progress(min(written / int(size), 1.0))
+            
+            # Drop any preallocated space the content didn't fill
+            f.truncate()
+    except BaseException:
+        # Also reached when Streamlit stops the script for a rerun; don't leave the download running
+        if future is not None:
+            future.cancel()
+        os.remove(file_path)
+        raise
+    
+    if progress_bar is not None:
+        progress_bar.empty()
+    return file_path
+
+def download_to_documents(service, file_path, file_name, file_id=None, known_mime_type=None, size=None, modified_time=None, async_client=None):
+    """
+    Download a Drive file into the documents folder, reusing an earlier download of the same version.
+    
+    Args:
+        service: Google Drive API service instance
+        file_path: Path of the file in Google Drive
+        file_name: Name to save the file as
+        file_id: (Optional) ID of the file, skips resolving file_path
+        known_mime_type: (Optional) mimeType of the file if the caller already knows it
+        size: (Optional) Size in bytes of the file, used to preallocate large files
+        modified_time: (Optional) modifiedTime of the file; together with file_id it identifies the version
+        async_client: (Optional) AsyncDriveClient to download regular files with in the background
+        
+    Returns:
+        Path where the file was saved
+    """
+    # A file that hasn't changed since this session downloaded it is already on disk
+    downloads = st.session_state.setdefault('downloads', {})
+    key = (file_id, modified_time) if file_id and modified_time else None
+    saved_path = downloads.get(key)
+    if saved_path is not None and os.path.exists(saved_path):
+        # modified_time comes from a listing that may be a few minutes old, so make sure
+        # the file hasn't changed since before handing out the old copy
+        current = limiter.call(service.files().get(fileId=file_id, fields='modifiedTime'))
+        if current.get('modifiedTime') == modified_time:
+            return saved_path
+        key = (file_id, current.get('modifiedTime'))
+    
+    if async_client is not None and file_id and known_mime_type and not known_mime_type.startswith('application/vnd.google-apps'):
+        saved_path = download_in_background(async_client, file_id, file_name, size=size)
+    else:
+        # Stream the file to disk under its proper name
+        content = get_file_content_stream(service, file_path, known_mime_type=known_mime_type, file_id=file_id)
+        saved_path = save_file_to_documents(content, file_name, size=size)
+    
+    if key is not None:
+        downloads[key] = saved_path
+    return saved_path
+
+def display_saved_file(saved_path, file_name):
+    """
+    Show a downloaded file: a text preview for text files, otherwise an image
+    preview (when it looks like one) and a download button.
+    
+    Args:
+        saved_path: Local path of the downloaded file
+        file_name: Name to offer the file under in the download button
+    """
+    # Only the beginning of the file is needed for the preview
+    with open(saved_path, 'rb') as f:
+        head = f.read(PREVIEW_BYTES)
+    
+    try:
+        # For text files (the incremental decoder tolerates a character cut off at the preview boundary)
+        text_content = codecs.getincrementaldecoder('utf-8')().decode(head)
+        st.text_area("File Content", text_content, height=300)
+        if len(head) == PREVIEW_BYTES:
+            st.caption("Showing the first 1 MB of the file.")
+    except UnicodeDecodeError:
+        # For binary files (like images)
+        st.write("Binary file detected.")
+        
+        # Check if it might be an image, going by the bytes we already read rather than the name
+        if _looks_like_image(head):
+            try:
+                st.image(saved_path)
+            except Exception as e:
+                # A file can pass the signature check and still not be a readable image;
+                # the download button below must render either way
+                logger.warning("Could not preview %s as an image: %s", file_name, e)
+        
+        # Provide download option
+        with open(saved_path, 'rb') as f:
+            st.download_button("Download File", f, file_name=file_name)
+
+def _looks_like_image(head):
+    """Check whether the start of a file matches one of the image formats we can preview."""
+    if head.startswith(IMAGE_SIGNATURES) or (head[:4] == b'RIFF' and head[8:12] == b'WEBP'):
+        return True
+    # BMP: "BM", the file size, two reserved (zero) fields, then the size of the DIB header
+    return (
+        len(head) >= 18
+        and head[:2] == b'BM'
+        and head[6:10] == b'\x00\x00\x00\x00'
+        and int.from_bytes(head[14:18], 'little') in BMP_DIB_HEADER_SIZES
+    )
+
+def move_file(service, file_id, folder_id, previous_parents=None):
+    # Get the file's current parents, unless the caller already knows them from a listing
+    if previous_parents is None:
+        file = limiter.call(service.files().get(fileId=file_id, fields='parents'))
+        previous_parents = ",".join(file.get('parents', []))
+    
+    # Move the file to the new folder
+    updated_file = limiter.call(service.files().update(
+        fileId=file_id,
+        addParents=folder_id,
+        removeParents=previous_parents,
+        fields='id, parents'
+    ))
+    _invalidate_caches(file_id)
+    metadata_cache.invalidate_folder(folder_id)
+    
+    return updated_file
+
+def _escape(name):
+    """Escape a value for use inside a quoted string in a Drive search query."""
+    return name.replace("\\", "\\\\").replace("'", "\\'")
+
+def _path_cache():
+    """Return the (parent_id, name) -> ((ID, mimeType), expiry) cache, kept in session state so it survives reruns.
+    
+    Entries are kept in least recently used order; use _cache_get/_cache_put to keep it that way.
+    """
+    return st.session_state.setdefault('path_cache', OrderedDict())
+
+def _cache_get(key):
+    """Return the cached (ID, mimeType) for a path segment, or None."""
+    cache = _path_cache()
+    with _path_cache_lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        item, expiry = entry
+        if expiry < time.monotonic():
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+    return item
+
+def _cache_put(key, item):
+    """Remember a path segment, dropping the least recently used one when the cache is full."""
+    cache = _path_cache()
+    with _path_cache_lock:
+        cache[key] = (item, time.monotonic() + PATH_CACHE_TTL)
+        cache.move_to_end(key)
+        if len(cache) > PATH_CACHE_SIZE:
+            cache.popitem(last=False)
+
+def _cache_discard(key):
+    """Forget a single path segment, if it is cached."""
+    cache = _path_cache()
+    with _path_cache_lock:
+        cache.pop(key, None)
+
+def _invalidate_path_cache(item_id):
+    """Drop cached path entries for an item that was moved or deleted."""
+    cache = _path_cache()
+    with _path_cache_lock:
+        stale = [key for key, ((cached_id, _), _) in cache.items() if cached_id == item_id or key[0] == item_id]
+        for key in stale:
+            del cache[key]
+
+def _invalidate_caches(item_id):
+    """Forget everything cached about an item that was moved or deleted."""
+    _invalidate_path_cache(item_id)
+    metadata_cache.invalidate_item(item_id)
+    list_files.clear()
+
+def _lookup(service, parent_id, name):
+    """Find the (ID, mimeType) of the item called name inside parent_id, or None if there isn't one."""
+    key = (parent_id, name)
+    item = _cache_get(key)
+    if item is not None:
+        return item
+    
+    # A fresh listing of the parent folder on disk saves the Drive query; trust it no
+    # longer than a session entry, so outside changes still show up after PATH_CACHE_TTL
+    cached_item = metadata_cache.find_child(parent_id, name, ttl=PATH_CACHE_TTL)
+    if cached_item is not None:
+        _cache_put(key, cached_item)
+        return cached_item
+    
+    # Search for the item with the given name in the parent folder
+    query = f"name = '{_escape(name)}' and '{parent_id}' in parents and trashed = false"
+    
+    # Two results are enough to tell whether the name is ambiguous
+    results = limiter.call(service.files().list(
+        q=query,
+        spaces='drive',
+        pageSize=2,
+        fields='files(id, mimeType)'
+    ))
+    
+    items = results.get('files', [])
+    
+    if not items:
+        return None
+    
+    # Guessing could delete or move the wrong item, so make the caller disambiguate
+    if len(items) > 1:
+        raise ValueError(f"More than one item named '{name}' in folder {parent_id}")
+    
+    item = (items[0]['id'], items[0]['mimeType'])
+    _cache_put(key, item)
+    return item
+
+def _root_id(service):
+    """Return the real ID of the My Drive root folder (listings report it instead of 'root')."""
+    if 'root_id' not in st.session_state:
+        root = limiter.call(service.files().get(fileId='root', fields='id'))
+        st.session_state.root_id = root['id']
+    return st.session_state.root_id
+
+def _lookup_chain(service, parent_id, names, path):
+    """Resolve several nested path segments below parent_id with a single files.list query.
+    
+    Args:
+        service: Google Drive API service instance
+        parent_id: ID of the folder the first name lives in
+        names: Consecutive path segments to resolve
+        path: Full path, used in error messages
+        
+    Returns:
+        (ID, mimeType) of the item the last name refers to
+    """
+    # Every segment but the last has to be a folder, which keeps the result set small
+    folder_names = " or ".join(f"name = '{_escape(name)}'" for name in dict.fromkeys(names[:-1]))
+    query = (
+        f"trashed = false and ((mimeType = 'application/vnd.google-apps.folder' and ({folder_names}))"
+        f" or name = '{_escape(names[-1])}')"
+    )
+    
+    # Index every match by (parent, name) so the chain can be rebuilt locally
+    children = {}
+    ambiguous = set()
+    drive_files = service.files()
+    page_token = None
+    while True:
+        results = limiter.call(drive_files.list(
+            q=query,
+            spaces='drive',
+            pageSize=1000,
+            fields='nextPageToken, files(id, name, mimeType, parents)',
+            pageToken=page_token
+        ))
+        
+        for item in results.get('files', []):
+            for item_parent in item.get('parents', []):
+                key = (item_parent, item['name'])
+                if key in children:
+                    ambiguous.add(key)
+                else:
+                    children[key] = (item['id'], item['mimeType'])
+        
+        page_token = results.get('nextPageToken', None)
+        if page_token is None:
+            break
+    
+    # Walk the chain from parent_id, caching each segment under the same keys _lookup uses
+    current_id = _root_id(service) if parent_id == 'root' else parent_id
+    for i, name in enumerate(names):
+        if (current_id, name) in ambiguous:
+            # Several siblings share the name; resolve the rest one segment at a
+            # time so this fails the same way an uncached lookup would
+            return _lookup_segments(service, parent_id, names[i:], path)
+        
+        item = children.get((current_id, name))
+        if item is None:
+            raise FileNotFoundError(f"Cannot find '{name}' in path '{path}'")
+        
+        _cache_put((parent_id, name), item)
+        parent_id = current_id = item[0]
+    
+    return item
+
+def _lookup_segments(service, parent_id, names, path):
+    """Resolve nested path segments below parent_id with one query per segment."""
+    for name in names:
+        item = _lookup(service, parent_id, name)
+        
+        if item is None:
+            raise FileNotFoundError(f"Cannot find '{name}' in path '{path}'")
+        
+        parent_id = item[0]
+    
+    return item
+
+def resolve_path(service, path):
+    """
+    Resolve a Drive path to the ID and mimeType of the item it points to.
+    
+    Args:
+        service: Google Drive API service instance
+        path: Slash separated path from the root of My Drive
+        
+    Returns:
+        (ID, mimeType) tuple
+    """
+    # Remove leading and trailing slashes
+    path = path.strip('/')
+    
+    if not path:
+        # Return root folder for empty path
+        return 'root', 'application/vnd.google-apps.folder'
+        
+    parts = path.split('/')
+    item = ('root', 'application/vnd.google-apps.folder')  # Start from root
+    
+    # Follow the part of the path that is already cached
+    resolved = 0
+    while resolved < len(parts):
+        cached_item = _cache_get((item[0], parts[resolved]))
+        if cached_item is None:
+            break
+        item = cached_item
+        resolved += 1
+    
+    remaining = parts[resolved:]
+    
+    # Resolve whatever is left with one query rather than one query per segment
+    if len(remaining) > 1:
+        return _lookup_chain(service, item[0], remaining, path)
+    
+    if remaining:
+        return _lookup_segments(service, item[0], remaining, path)
+    
+    # Return the last item found
+    return item
+
+def find_id_by_path(service, path):
+    return resolve_path(service, path)[0]
+
+def resolve_with_parent(service, path):
+    """
+    Resolve a path to the item it points to and the folder it is in, walking the
+    shared prefix only once.
+    
+    Args:
+        service: Google Drive API service instance
+        path: Slash separated path from the root of My Drive
+        
+    Returns:
+        (ID of the parent folder, ID of the item) tuple
+    """
+    parent_path, _, name = path.strip('/').rpartition('/')
+    if not name:
+        raise ValueError("The root folder has no parent")
+    
+    parent_id = find_id_by_path(service, parent_path)
+    item = _lookup(service, parent_id, name)
+    if item is None:
+        raise FileNotFoundError(f"Cannot find '{name}' in path '{path}'")
+    return parent_id, item[0]
+
+def resolve_paths(service, paths):
+    """
+    Resolve many Drive paths at once. The parent folders come from resolve_path (and
+    so mostly from the path cache), and the final segments of all paths are looked
+    up together with one query per NAMES_PER_QUERY (parent, name) pairs.
+    
+    Args:
+        service: Google Drive API service instance
+        paths: Slash separated paths from the root of My Drive
+        
+    Returns:
+        Dict mapping each path to a file dict (id, name, mimeType, parents), or to the
+        exception that kept it from being resolved
+    """
+    resolved = {}
+    wanted = {}
+    for path in dict.fromkeys(paths):
+        parent_path, _, name = path.strip('/').rpartition('/')
+        if not name:
+            resolved[path] = ValueError("The root folder cannot be moved or deleted")
+            continue
+        try:
+            parent_id, _ = resolve_path(service, parent_path)
+        except Exception as e:
+            resolved[path] = e
+            continue
+        # Listings report the real root ID instead of the 'root' alias
+        if parent_id == 'root':
+            parent_id = _root_id(service)
+        wanted.setdefault((parent_id, name), []).append(path)
+    
+    # Look up every final segment inside its own parent, so a common name doesn't
+    # page through every same-named file in the account
+    matches = {}
+    keys = list(wanted)
+    drive_files = service.files()
+    for i in range(0, len(keys), NAMES_PER_QUERY):
+        name_query = " or ".join(
+            f"('{parent_id}' in parents and name = '{_escape(name)}')"
+            for parent_id, name in keys[i:i + NAMES_PER_QUERY]
+        )
+        page_token = None
+        while True:
+            results = limiter.call(drive_files.list(
+                q=f"trashed = false and ({name_query})",
+                spaces='drive',
+                pageSize=1000,
+                fields='nextPageToken, files(id, name, mimeType, parents)',
+                pageToken=page_token
+            ))
+            
+            for item in results.get('files', []):
+                for item_parent in item.get('parents', []):
+                    key = (item_parent, item['name'])
+                    if key in wanted:
+                        matches.setdefault(key, []).append(item)
+            
+            page_token = results.get('nextPageToken', None)
+            if page_token is None:
+                break
+    
+    for (parent_id, name), key_paths in wanted.items():
+        items = matches.get((parent_id, name), [])
+        for path in key_paths:
+            if not items:
+                resolved[path] = FileNotFoundError(f"Cannot find '{name}' in path '{path}'")
+            elif len(items) > 1:
+                # Guessing could delete or move the wrong item, so make the caller disambiguate
+                resolved[path] = ValueError(f"More than one item named '{name}' in folder {parent_id}")
+            else:
+                resolved[path] = items[0]
+    
+    return resolved
+
+def delete_file(service, file_id):
+    limiter.call(service.files().delete(fileId=file_id))
+    _invalidate_caches(file_id)
+    return True
+
+def _batch_execute(service, item_ids, make_request, max_workers=DRIVE_WORKERS, ignore_not_found=False):
+    """Send one request per item through Drive batch requests.
+    
+    Args:
+        service: Google Drive API service instance
+        item_ids: IDs of the items to act on
+        make_request: Builds the request for an item ID, e.g. lambda file_id: service.files().delete(fileId=file_id)
+        max_workers: Number of batches sent concurrently
+        ignore_not_found: Treat a 404 as success (the item is already gone)
+        
+    Returns:
+        Dict mapping the IDs whose request failed to their error
+    """
+    failed = {}
+    
+    def callback(request_id, response, exception):
+        if exception is None:
+            return
+        if ignore_not_found and isinstance(exception, HttpError) and exception.resp.status == 404:
+            return
+        failed[request_id] = exception
+    
+    def send(chunk):
+        batch = service.new_batch_http_request(callback=callback)
+        for item_id in chunk:
+            request = make_request(item_id)
+            batch.add(request, request_id=item_id)
+        # Every call inside the batch counts against the quota, and the limiter retries
+        # rate-limited batches after Retry-After
+        limiter.call(batch, cost=len(chunk), http=_thread_http(request.http.credentials))
+    
+    # A batch rejects repeated request IDs, and the same item can be listed twice
+    # (a path given twice, or an item with several parents in a folder listing)
+    pending = list(dict.fromkeys(item_ids))
+    for attempt in range(limiter.max_retries + 1):
+        # One HTTP round trip per BATCH_SIZE items instead of one per item, with
+        # several batches in flight at once
+        chunks = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(send, chunks))
+        
+        # A batch that went through can still hold rate limited or failed (5xx) calls,
+        # so send just those again in a retry batch
+        pending = [item_id for item_id, error in failed.items() if isinstance(error, HttpError) and is_retryable(error)]
+        if not pending or attempt == limiter.max_retries:
+            break
+        for item_id in pending:
+            del failed[item_id]
+        time.sleep(backoff_delay(attempt))
+    
+    return failed
+
+def batch_delete(service, file_ids, max_workers=DRIVE_WORKERS):
+    """Delete files/folders using Drive batch requests.
+    
+    Args:
+        service: Google Drive API service instance
+        file_ids: IDs of the items to delete. Folders are deleted together with their contents.
+        max_workers: Number of batches sent concurrently
+        
+    Returns:
+        Dict mapping the IDs that could not be deleted to their error
+    """
+    drive_files = service.files()
+    # A 404 means the item is already gone, which is what we wanted
+    return _batch_execute(
+        service, file_ids, lambda file_id: drive_files.delete(fileId=file_id),
+        max_workers=max_workers, ignore_not_found=True
+    )
+
+def batch_move(service, moves, max_workers=DRIVE_WORKERS):
+    """Move files/folders using Drive batch requests.
+    
+    Args:
+        service: Google Drive API service instance
+        moves: Dict mapping the IDs of the items to move to (destination folder ID, comma separated current parents)
+        max_workers: Number of batches sent concurrently
+        
+    Returns:
+        Dict mapping the IDs that could not be moved to their error
+    """
+    drive_files = service.files()
+    
+    def make_request(file_id):
+        folder_id, previous_parents = moves[file_id]
+        return drive_files.update(
+            fileId=file_id,
+            addParents=folder_id,
+            removeParents=previous_parents,
+            fields='id, parents'
+        )
+    
+    return _batch_execute(service, list(moves), make_request, max_workers=max_workers)
+
+def run_drive_ops(service, operations):
+    """
+    Move and delete many items by path with as few Drive round trips as possible.
+    
+    All paths are resolved up front by resolve_paths, then the moves and deletes
+    are sent through batch requests.
+    
+    Args:
+        service: Google Drive API service instance
+        operations: List of {"action": "move" or "delete", "path": ..., "dest": ...} dicts,
+            where dest is the destination folder path of a move
+        
+    Returns:
+        Dict mapping each operation's path to None if it succeeded, or an error message
+    """
+    results = {}
+    resolved = resolve_paths(service, [operation.get('path', '') for operation in operations])
+    
+    # Sort the operations into moves and deletes by item ID
+    moves = {}
+    deletes = []
+    paths_by_id = {}
+    dest_ids = {}
+    for operation in operations:
+        path = operation.get('path', '')
+        item = resolved[path]
+        if isinstance(item, Exception):
+            results[path] = str(item)
+            continue
+        
+        action = operation.get('action')
+        if action == 'delete':
+            deletes.append(item['id'])
+        elif action == 'move':
+            dest = operation.get('dest') or '/'
+            try:
+                if dest not in dest_ids:
+                    dest_ids[dest] = find_id_by_path(service, dest)
+            except Exception as e:
+                results[path] = str(e)
+                continue
+            moves[item['id']] = (dest_ids[dest], ",".join(item.get('parents', [])))
+        else:
+            results[path] = f"Unknown action '{action}'"
+            continue
+        paths_by_id[item['id']] = path
+    
+    failed = _apply_drive_ops(service, deletes, moves)
+    for item_id, path in paths_by_id.items():
+        results[path] = str(failed[item_id]) if item_id in failed else None
+    
+    return results
+
+def _apply_drive_ops(service, deletes, moves):
+    """Send deletes and moves through batch requests, then forget what was cached about the items that changed.
     
-    # If a parent folder is specified, add it to the metadata
-    if parent_id:
-        folder_metadata['parents'] = [parent_id]
+    Args:
+        service: Google Drive API service instance
+        deletes: IDs of the items to delete
+        moves: Dict mapping the IDs of the items to move to (destination folder ID, comma separated current parents)
         
-    print(f"Making API request to create folder: {json.dumps(folder_metadata, indent=2)}")
-    folder = service.files().create(body=folder_metadata, fields='id').execute()
-    print(f"API response: {json.dumps(folder, indent=2)}")
+    Returns:
+        Dict mapping the IDs that failed to their error
+    """
+    failed = batch_delete(service, deletes)
+    failed.update(batch_move(service, moves))
     
-    folder_id = folder.get('id')
-    print(f"Folder created with ID: {folder_id}")
+    for item_id in [*deletes, *moves]:
+        if item_id not in failed:
+            _invalidate_path_cache(item_id)
+            metadata_cache.invalidate_item(item_id)
+    for folder_id in {folder_id for folder_id, _ in moves.values()}:
+        metadata_cache.invalidate_folder(folder_id)
+    list_files.clear()
     
-    return folder_id
+    return failed
 
-def save_file_to_documents(content, filename):
+def _matches_type(mime_type, file_type):
+    """Check whether a mimeType belongs to one of the FILE_TYPES (or 'any'/'file')."""
+    if file_type == 'any':
+        return True
+    if file_type == 'file':
+        return mime_type != 'application/vnd.google-apps.folder'
+    return mime_type.startswith(FILE_TYPES[file_type])
+
+def run_filtered_op(service, folder_path, action, name_pattern='*', file_type='any', destination=None):
     """
-    Save file content to the documents folder in the same directory.
+    Move or delete every item in a folder that matches a filter. The folder is listed once
+    (uncached), the filter is applied locally and the changes go out through batch requests, so the
+    agent decides on the operation once instead of once per file.
     
     Args:
-        content: File content as bytes
-        filename: Name to save the file as
+        service: Google Drive API service instance
+        folder_path: Folder whose items are filtered
+        action: "move" or "delete"
+        name_pattern: Shell style pattern the item names must match (case insensitive), e.g. "*.jpg"
+        file_type: 'any', 'file' or one of the FILE_TYPES
+        destination: Path of the destination folder, required for moves
         
     Returns:
-        Path where the file was saved
+        List of (name, error) tuples for the matching items, error being None if the operation succeeded
     """
-    # Create documents directory if it doesn't exist
-    documents_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'documents')
-    if not os.path.exists(documents_dir):
-        os.makedirs(documents_dir)
+    if action not in ('move', 'delete'):
+        raise ValueError(f"Unknown action '{action}'")
+    if file_type not in ('any', 'file') and file_type not in FILE_TYPES:
+        raise ValueError(f"Unknown file type '{file_type}'")
     
-    # Clean filename to avoid path traversal issues
-    safe_filename = os.path.basename(filename)
+    dest_id = None
+    if action == 'move':
+        if not destination:
+            raise ValueError("A destination folder is needed to move items")
+        dest_id, mime_type = resolve_path(service, destination)
+        if mime_type != 'application/vnd.google-apps.folder':
+            raise ValueError(f"'{destination}' is not a folder")
     
-    # Create full path
-    file_path = os.path.join(documents_dir, safe_filename)
+    folder_id, folder_mime = resolve_path(service, folder_path)
+    if folder_mime != 'application/vnd.google-apps.folder':
+        raise ValueError(f"'{folder_path}' is not a folder")
     
-    # If file exists, append a number to avoid overwriting
-    base_name, extension = os.path.splitext(safe_filename)
-    counter = 1
-    while os.path.exists(file_path):
-        file_path = os.path.join(documents_dir, f"{base_name}_{counter}{extension}")
-        counter += 1
+    # Deleting and moving act on what is in the folder right now, so skip the listing
+    # caches: anything moved out of the folder since they were filled must not be touched
+    pattern = name_pattern.lower()
+    matches = [
+        file for file in _list_children(service, [folder_id], fields='id, name, mimeType, parents')
+        if fnmatch.fnmatch(file['name'].lower(), pattern) and _matches_type(file['mimeType'], file_type)
+    ]
     
-    # Save the file
-    mode = 'wb' if isinstance(content, bytes) else 'w'
-    with open(file_path, mode) as f:
-        f.write(content)
+    if action == 'delete':
+        failed = _apply_drive_ops(service, [file['id'] for file in matches], {})
+    else:
+        # Don't move the destination folder into itself
+        moves = {
+            file['id']: (dest_id, ",".join(file.get('parents', [])))
+            for file in matches if file['id'] != dest_id
+        }
+        failed = _apply_drive_ops(service, [], moves)
     
-    return file_path
+    return [(file['name'], str(failed[file['id']]) if file['id'] in failed else None) for file in matches]
 
-def get_file_content(service, file_id):
-    try:
-        # Get file metadata to check if it's a Google Workspace file
-        file_metadata = service.files().get(fileId=file_id, fields='mimeType,name').execute()
-        mime_type = file_metadata.get('mimeType', '')
-        
-        # Check if it's a Google Workspace file
-        if mime_type.startswith('application/vnd.google-apps'):
-            if mime_type == 'application/vnd.google-apps.document':
-                # Export Google Doc as plain text
-                content = service.files().export(
-                    fileId=file_id, 
-                    mimeType='text/plain'
-                ).execute()
-                return content
-            elif mime_type == 'application/vnd.google-apps.spreadsheet':
-                # Export as CSV
-                content = service.files().export(
-                    fileId=file_id, 
-                    mimeType='text/csv'
-                ).execute()
-                return content
-            elif mime_type == 'application/vnd.google-apps.presentation':
-                # Export as PDF
-                content = service.files().export(
-                    fileId=file_id, 
-                    mimeType='application/pdf'
-                ).execute()
-                return content
-            else:
-                # Other Google Workspace files
-                raise ValueError(f"Cannot download Google Workspace file of type: {mime_type}")
-        else:
-            # Regular file download
-            request = service.files().get_media(fileId=file_id)
-            file_content = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_content, request)
-            
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-                
-            file_content.seek(0)
-            return file_content.read()
-            
-    except Exception as e:
-        logging.error(f"Error downloading file {file_id}: {str(e)}")
-        raise
+def _list_children(service, folder_ids, fields='id, mimeType, parents'):
+    """List every item directly inside any of the given folders with a single (paged) query.
     
-def list_files(service, page_size=10, query=None):
-    results = []
+    Never cached. Safe to call from worker threads: requests go out over the calling
+    thread's own connection.
+    """
+    parents_query = " or ".join(f"'{folder_id}' in parents" for folder_id in folder_ids)
+    query = f"trashed = false and ({parents_query})"
+    items = []
+    drive_files = service.files()
     page_token = None
     
     while True:
-        try:
-            # Build the request
-            request = service.files().list(
-                q=query,
-                pageSize=page_size,
-                fields="nextPageToken, files(id, name, mimeType, parents, createdTime, modifiedTime, size)",
-                pageToken=page_token
-            )
-            
-            # Execute the request
-            response = request.execute()
-            
-            # Add the files from this page to our list
-            results.extend(response.get('files', []))
-            
-            # Get the next page token
-            page_token = response.get('nextPageToken', None)
-            
-            # If there are no more pages, break the loop
-            if page_token is None:
-                break
-                
-        except Exception as error:
-            print(f"An error occurred: {error}")
-            st.error(f"An error occurred while listing files: {error}")
+        request = drive_files.list(
+            q=query,
+            spaces='drive',
+            pageSize=1000,
+            fields=f'nextPageToken, files({fields})',
+            pageToken=page_token
+        )
+        results = limiter.call(request, http=_thread_http(request.http.credentials))
+        items.extend(results.get('files', []))
+        
+        page_token = results.get('nextPageToken', None)
+        if page_token is None:
             break
-            
-    return results
-
-def move_file(service, file_id, folder_id):
-    # Get the file's current parents
-    file = service.files().get(fileId=file_id, fields='parents').execute()
-    previous_parents = ",".join(file.get('parents', []))
-    
-    # Move the file to the new folder
-    updated_file = service.files().update(
-        fileId=file_id,
-        addParents=folder_id,
-        removeParents=previous_parents,
-        fields='id, parents'
-    ).execute()
     
-    return updated_file
+    return items
 
-def move_file(service, file_id, folder_id):
-    # Get the file's current parents
-    file = service.files().get(fileId=file_id, fields='parents').execute()
-    previous_parents = ",".join(file.get('parents', []))
-    
-    # Move the file to the new folder
-    updated_file = service.files().update(
-        fileId=file_id,
-        addParents=folder_id,
-        removeParents=previous_parents,
-        fields='id, parents'
-    ).execute()
+def list_descendants(service, root_id, max_workers=DRIVE_WORKERS):
+    """
+    List everything below a folder, one depth at a time.
     
-    return updated_file
-
-def find_id_by_path(service, path):
-    # Remove leading and trailing slashes
-    path = path.strip('/')
+    Each wave OR-joins up to PARENTS_PER_QUERY folders into one files.list query,
+    so a tree costs roughly one request per PARENTS_PER_QUERY folders instead of
+    one per folder. The queries of a wave run concurrently.
     
-    if not path:
-        # Return root folder for empty path
-        return 'root'
+    Args:
+        service: Google Drive API service instance
+        root_id: ID of the folder to walk
+        max_workers: Number of queries run concurrently
         
-    parts = path.split('/')
-    parent_id = 'root'  # Start from root
+    Returns:
+        List of levels, each a list of items (id, mimeType, parents); level 0 holds the direct children
+    """
+    levels = []
+    frontier = [root_id]
     
-    # Navigate through each part of the path
-    for i, part in enumerate(parts):
-        # Determine if we're looking for the final item or a parent folder
-        is_last = (i == len(parts) - 1)
-        
-        # Search for the item with the given name in the parent folder
-        query = f"name = '{part}' and '{parent_id}' in parents and trashed = false"
-        
-        results = service.files().list(
-            q=query,
-            spaces='drive',
-            fields='files(id, name, mimeType)'
-        ).execute()
-        
-        items = results.get('files', [])
-        
-        if not items:
-            raise FileNotFoundError(f"Cannot find '{part}' in path '{path}'")
-        
-        # Update parent_id for next iteration
-        parent_id = items[0]['id']
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while frontier:
+            groups = [frontier[i:i + PARENTS_PER_QUERY] for i in range(0, len(frontier), PARENTS_PER_QUERY)]
+            level = []
+            for items in executor.map(lambda group: _list_children(service, group), groups):
+                level.extend(items)
+            
+            if not level:
+                break
+            levels.append(level)
+            frontier = [item['id'] for item in level if item['mimeType'] == 'application/vnd.google-apps.folder']
     
-    # Return the ID of the last item found
-    return parent_id
+    return levels
 
-def delete_file(service, file_id):
-    service.files().delete(fileId=file_id).execute()
-    return True
-
-def delete_folder(service, folder_id, recursive=True):
+def delete_folder(service, folder_id, recursive=True, max_workers=DRIVE_WORKERS):
     if recursive:
-        # Get all files and subfolders in this folder
-        query = f"'{folder_id}' in parents and trashed = false"
-        results = service.files().list(
-            q=query,
-            spaces='drive',
-            fields='files(id, mimeType)'
-        ).execute()
-        
-        items = results.get('files', [])
+        # Batch requests may run in any order, so delete one group at a time so
+        # no batch mixes a folder with its contents
+        failed = {}
+        for group in deletion_order(list_descendants(service, folder_id, max_workers)):
+            failed.update(batch_delete(service, group, max_workers))
         
-        # Delete each item
-        for item in items:
-            if item['mimeType'] == 'application/vnd.google-apps.folder':
-                delete_folder(service, item['id'], recursive=True)
-            else:
-                delete_file(service, item['id'])
+        if failed:
+            for item_id, error in failed.items():
+                logger.error("Error deleting item %s: %s", item_id, error)
+            raise RuntimeError(f"Failed to delete {len(failed)} item(s) inside folder {folder_id}")
     
-    # Delete the folder itself
-    service.files().delete(fileId=folder_id).execute()
+    # Delete the folder itself. Without recursive this is the only request made.
+    limiter.call(service.files().delete(fileId=folder_id))
+    _invalidate_caches(folder_id)
+    return True
+
+def delete_folder_async(async_client, folder_id):
+    """Delete a folder tree with the aiohttp backend, which overlaps the individual deletes."""
+    asyncio.run(async_client.delete_folder(folder_id))
+    _invalidate_caches(folder_id)
     return True
 
-def delete_by_path(service, path, is_folder=None):
+def delete_by_path(service, path, is_folder=None, async_client=None):
     try:
-        # Find the ID of the item at the specified path
-        item_id = find_id_by_path(service, path)
+        # Find the ID of the item at the specified path, along with its type
+        item_id, mime_type = resolve_path(service, path)
         
         # Determine if it's a folder if not specified
         if is_folder is None:
-            file_info = service.files().get(fileId=item_id, fields='mimeType').execute()
-            is_folder = file_info['mimeType'] == 'application/vnd.google-apps.folder'
+            is_folder = mime_type == 'application/vnd.google-apps.folder'
         
         # Delete appropriately based on type
-        if is_folder:
+        if is_folder and async_client is not None:
+            return delete_folder_async(async_client, item_id)
+        elif is_folder:
             return delete_folder(service, item_id)
         else:
             return delete_file(service, item_id)
             
     except Exception as e:
-        logging.error(f"Error deleting '{path}': {str(e)}")
+        logger.error("Error deleting '%s': %s", path, e)
         raise
 
-def list_files(service, folder_path='/', page_size=10, query=None):
+# Memoized per service object so reruns don't list the same folder again. The service is
+# shared by every session of the same Google account (see get_drive_service), and so is
+# this cache; list_files.clear() empties it for all sessions.
+@st.cache_data(ttl=60, show_spinner=False, hash_funcs={Resource: id})
+def list_files(service, folder_path='/', page_size=1000, query=None, max_results=None, fields=LIST_FIELDS):
+    """
+    List the files and folders inside a Drive folder.
+    
+    Args:
+        service: Google Drive API service instance
+        folder_path: Path of the folder to list
+        page_size: Items requested per page (at most 1000)
+        query: (Optional) Extra Drive query the items have to match
+        max_results: (Optional) Stop after this many items
+        fields: File fields to return, e.g. LIST_FIELDS + ', parents, size'. Part of the
+            memoization key, and a cached SQLite listing is only used if it was fetched
+            with at least these fields
+        
+    Returns:
+        List of file dicts
+    """
     try:
         # Find the folder ID from the path
         folder_id = find_id_by_path(service, folder_path)
         
+        # Plain folder listings are served from the metadata cache while it is fresh and
+        # holds every requested field; trust it no longer than a path cache entry
+        if query is None:
+            cached = metadata_cache.get_children(folder_id, fields, ttl=PATH_CACHE_TTL)
+            if cached is not None:
+                return cached if max_results is None else cached[:max_results]
+        
         # Build folder-specific query
         folder_query = f"'{folder_id}' in parents and trashed = false"
         
@@ -348,164 +1274,358 @@ def list_files(service, folder_path='/', page_size=10, query=None):
             combined_query = folder_query
         
         results = []
+        drive_files = service.files()
         page_token = None
+        complete = False
         
         while True:
             try:
+                # Drive returns at most 1000 items per page, and we don't need more than the caller still wants
+                page_size = min(page_size, 1000)
+                if max_results is not None:
+                    page_size = min(page_size, max_results - len(results))
+                
                 # Build the request
-                request = service.files().list(
+                request = drive_files.list(
                     q=combined_query,
                     pageSize=page_size,
-                    fields="nextPageToken, files(id, name, mimeType, parents, createdTime, modifiedTime, size)",
+                    fields=f"nextPageToken, files({fields})",
                     pageToken=page_token
                 )
                 
                 # Execute the request
-                response = request.execute()
+                response = limiter.call(request)
                 
                 # Add the files from this page to our list
                 results.extend(response.get('files', []))
                 
+                # Stop once we have as many items as the caller asked for
+                if max_results is not None and len(results) >= max_results:
+                    break
+                
                 # Get the next page token
                 page_token = response.get('nextPageToken', None)
                 
                 # If there are no more pages, break the loop
                 if page_token is None:
+                    complete = True
                     break
                     
             except Exception as error:
-                print(f"An error occurred: {error}")
+                logger.debug("Listing page failed: %s", error)
                 raise
+        
+        # Only whole, unfiltered listings can stand in for the folder later
+        if query is None and complete:
+            metadata_cache.put_children(folder_id, results, fields)
                 
         return results
         
     except Exception as e:
-        logging.error(f"Error listing files in path '{folder_path}': {str(e)}")
+        logger.error("Error listing files in path '%s': %s", folder_path, e)
         raise
         
-def get_file_content(service, file_path):
-    try:
-        # Find the file ID from the path
-        file_id = find_id_by_path(service, file_path)
-        
-        # Get file metadata to check if it's a Google Workspace file
-        file_metadata = service.files().get(fileId=file_id, fields='mimeType,name').execute()
+def _is_not_downloadable(error):
+    """Check whether an HttpError means the file has to be exported instead."""
+    return error.resp.status == 403 and b'fileNotDownloadable' in (error.content or b'')
+
+def _export_request(service, file_id, mime_type=None):
+    """Build the export request for a Google Workspace file (Docs, Sheets, Slides)."""
+    # Only ask Drive for the type when the caller doesn't already know it
+    if mime_type is None:
+        file_metadata = limiter.call(service.files().get(fileId=file_id, fields='mimeType,name'))
         mime_type = file_metadata.get('mimeType', '')
+    
+    export_mime = EXPORT_MAP.get(mime_type)
+    if export_mime is None:
+        # Other Google Workspace files
+        raise ValueError(f"Cannot download Google Workspace file of type: {mime_type}")
+    
+    return service.files().export_media(fileId=file_id, mimeType=export_mime)
+
+def _iter_media(request, chunk_size):
+    """Yield the content of a media request one downloaded chunk at a time."""
+    buffer = io.BytesIO()
+    downloader = MediaIoBaseDownload(buffer, request, chunksize=chunk_size)
+    
+    done = False
+    while not done:
+        limiter.acquire()
+        status, done = downloader.next_chunk(num_retries=limiter.max_retries)
         
-        # Check if it's a Google Workspace file
-        if mime_type.startswith('application/vnd.google-apps'):
-            if mime_type == 'application/vnd.google-apps.document':
-                # Export Google Doc as plain text
-                content = service.files().export(
-                    fileId=file_id, 
-                    mimeType='text/plain'
-                ).execute()
-                return content
-            elif mime_type == 'application/vnd.google-apps.spreadsheet':
-                # Export as CSV
-                content = service.files().export(
-                    fileId=file_id, 
-                    mimeType='text/csv'
-                ).execute()
-                return content
-            elif mime_type == 'application/vnd.google-apps.presentation':
-                # Export as PDF
-                content = service.files().export(
-                    fileId=file_id, 
-                    mimeType='application/pdf'
-                ).execute()
-                return content
-            else:
-                # Other Google Workspace files
-                raise ValueError(f"Cannot download Google Workspace file of type: {mime_type}")
-        else:
-            # Regular file download
-            request = service.files().get_media(fileId=file_id)
-            file_content = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_content, request)
-            
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-                
-            file_content.seek(0)
-            return file_content.read()
-            
-    except Exception as e:
-        logging.error(f"Error downloading file at path '{file_path}': {str(e)}")
-        raise
+        # Hand the chunk over and reuse the buffer for the next one
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def get_file_content_stream(service, file_path, chunk_size=STREAM_CHUNK_BYTES, known_mime_type=None, file_id=None):
+    """
+    Yield the content of a file in chunks, so callers can write it out without
+    holding the whole file in memory.
+    
+    Args:
+        service: Google Drive API service instance
+        file_path: Path of the file in Google Drive
+        chunk_size: Size in bytes of each downloaded chunk
+        known_mime_type: (Optional) mimeType of the file if the caller already knows it
+        file_id: (Optional) ID of the file, skips resolving file_path
+        
+    Yields:
+        Chunks of the file content as bytes
+    """
+    # Resolving the path also tells us the type, so Workspace files go straight to export
+    if file_id is None:
+        file_id, resolved_mime_type = resolve_path(service, file_path)
+        known_mime_type = known_mime_type or resolved_mime_type
+    
+    if known_mime_type is not None and known_mime_type.startswith('application/vnd.google-apps'):
+        yield from _iter_media(_export_request(service, file_id, known_mime_type), chunk_size)
+        return
+    
+    chunks = _iter_media(service.files().get_media(fileId=file_id), chunk_size)
+    
+    try:
+        first_chunk = next(chunks)
+    except StopIteration:
+        return
+    except HttpError as e:
+        if not _is_not_downloadable(e):
+            raise
+        # Google Workspace files have to be exported instead
+        yield from _iter_media(_export_request(service, file_id), chunk_size)
+        return
+    
+    yield first_chunk
+    yield from chunks
 
 def list_all_files_and_save(service):
     """
     Lists all files/folders in Google Drive and saves the list to a CSV file in the documents directory.
     
+    Rows are written as each page arrives, so only one page of metadata is held in memory.
+    
     Args:
         service: Google Drive API service instance
         
     Returns:
-        Path to the saved CSV file and the list of files
+        Path to the saved CSV file and the number of files written
     """
     try:
-        # Get all files (not just in a specific folder)
-        all_files = []
-        page_token = None
-        
-        while True:
-            # Query all files that aren't trashed
-            request = service.files().list(
-                q="trashed = false",
-                pageSize=1000,  # Get a large batch
-                fields="nextPageToken, files(id, name, mimeType, parents, createdTime, modifiedTime, size, webViewLink)",
-                pageToken=page_token
-            )
-            
-            response = request.execute()
-            all_files.extend(response.get('files', []))
-            
-            # Get the next page token
-            page_token = response.get('nextPageToken', None)
-            
-            # If there are no more pages, break the loop
-            if page_token is None:
-                break
-        
-        # Create documents directory if it doesn't exist
-        documents_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'documents')
-        if not os.path.exists(documents_dir):
-            os.makedirs(documents_dir)
-        
         # Create a timestamped filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         csv_filename = f"drive_files_{timestamp}.csv"
-        csv_path = os.path.join(documents_dir, csv_filename)
+        csv_path = os.path.join(DOCUMENTS_DIR, csv_filename)
         
-        # Write the files to a CSV
-        with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['Name', 'Type', 'ID', 'Created', 'Modified', 'Size (bytes)', 'Parents', 'Web Link'])
-            
-            for file in all_files:
-                # Determine file type
-                file_type = "Folder" if file.get("mimeType") == "application/vnd.google-apps.folder" else "File"
+        count = 0
+        drive_files = service.files()
+        page_token = None
+        
+        try:
+            with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+                writer.writerow(['Name', 'Type', 'ID', 'Created', 'Modified', 'Size (bytes)', 'Parents', 'Web Link'])
                 
-                # Write file info to CSV
-                writer.writerow([
-                    file.get('name', 'Unknown'),
-                    file_type,
-                    file.get('id', ''),
-                    file.get('createdTime', ''),
-                    file.get('modifiedTime', ''),
-                    file.get('size', 'N/A'),
-                    file.get('parents', []),
-                    file.get('webViewLink', '')
-                ])
+                while True:
+                    # Query all files that aren't trashed
+                    request = drive_files.list(
+                        q="trashed = false",
+                        pageSize=1000,  # Get a large batch
+                        fields="nextPageToken, files(id, name, mimeType, parents, createdTime, modifiedTime, size, webViewLink)",
+                        pageToken=page_token
+                    )
+                    
+                    response = limiter.call(request)
+                    files = response.get('files', [])
+                    
+                    # Write this page's files to the CSV
+                    writer.writerows(_csv_row(file) for file in files)
+                    count += len(files)
+                    
+                    # Get the next page token
+                    page_token = response.get('nextPageToken', None)
+                    
+                    # If there are no more pages, break the loop
+                    if page_token is None:
+                        break
+        except Exception:
+            # Don't leave a truncated listing behind
+            os.remove(csv_path)
+            raise
         
-        return csv_path, all_files
+        return csv_path, count
         
     except Exception as e:
-        logging.error(f"Error listing all files: {str(e)}")
+        logger.error("Error listing all files: %s", e)
         raise
 
+def _csv_row(file):
+    """Turn one file resource into a row of the all-files CSV."""
+    get = file.get
+    
+    # Determine file type
+    file_type = "Folder" if get("mimeType") == "application/vnd.google-apps.folder" else "File"
+    
+    return (
+        get('name', 'Unknown'),
+        file_type,
+        get('id', ''),
+        get('createdTime', ''),
+        get('modifiedTime', ''),
+        get('size', 'N/A'),
+        get('parents', []),
+        get('webViewLink', '')
+    )
+
+
+# Instructions the Drive agent gets ahead of every request
+AGENT_SYSTEM_PROMPT = (
+    "You manage the user's Google Drive with the tools you are given. Paths start at the root "
+    "of My Drive, e.g. '/Photos/cat.jpg'. To move or delete everything in a folder that matches "
+    "a name pattern or file type (e.g. all images), call plan_then_execute. To move or delete "
+    "several specific items, call batch_drive_ops once with every operation. For other requests "
+    "that touch several items, call the batch tool once with every invocation instead of calling "
+    "the other tools one at a time."
+)
+
+class AgentJob:
+    """
+    An agent run in a background thread, holding the progress the Drive Agent tab
+    shows while it runs.
+    
+    Args:
+        query: The user's request
+    """
+    
+    def __init__(self, query):
+        self.query = query
+        self.steps = []
+        self.answer = ""
+        self.error = None
+        self.done = False
+
+class ToolExecutionHandler(BaseCallbackHandler):
+    """Callback handler that records the agent's tool calls on an AgentJob."""
+    
+    # Call the handler on the agent's own event loop instead of a worker thread
+    run_inline = True
+    
+    def __init__(self, job):
+        self.job = job
+    
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        tool_name = serialized.get("name", "unknown")
+        self.job.steps.append(f"🔧 Executing tool: {tool_name} with input: {input_str}")
+        
+    def on_tool_end(self, output, **kwargs):
+        self.job.steps.append(f"✅ Tool execution result: {output[:100]}...")
+        
+    def on_tool_error(self, error, **kwargs):
+        self.job.steps.append(f"❌ Tool execution error: {str(error)}")
+
+def run_agent_job(agent, job):
+    """
+    Run the agent for job.query, recording the tool calls and the answer as it streams
+    in on the job. Meant to run in a background thread, so the script run (and with it
+    the other tabs) isn't blocked while the model works.
+    """
+    async def run():
+        async for event in agent.astream_events(
+            {"input": job.query},
+            {"callbacks": [ToolExecutionHandler(job)]},
+            version="v2"
+        ):
+            if event["event"] == "on_chat_model_start":
+                # Text from a turn that ended in a tool call isn't the answer, so only
+                # keep what the latest model turn has streamed
+                job.answer = ""
+            elif event["event"] == "on_chat_model_stream" and event["data"]["chunk"].content:
+                job.answer += event["data"]["chunk"].content
+            elif event["event"] == "on_chain_end" and not event["parent_ids"]:
+                # The executor's own result is the final answer
+                job.answer = event["data"]["output"]["output"]
+    
+    try:
+        asyncio.run(run())
+    except Exception as e:
+        logger.error("Agent execution error: %s", e)
+        job.error = (str(e), traceback.format_exc())
+    finally:
+        job.done = True
+
+def _show_agent_job(job):
+    """Write a (possibly still running) agent job's steps and answer to the page."""
+    st.write(f"Request: {job.query}")
+    for step in job.steps:
+        st.write(step)
+    
+    if job.error is not None:
+        message, details = job.error
+        st.error(f"Agent execution error: {message}")
+        st.code(details)
+        st.write("I encountered an error while trying to perform this action.")
+    elif job.answer or job.done:
+        st.success("Agent Response:")
+        st.write(job.answer)
+    
+    if not job.done:
+        st.caption("Thinking...")
+
+@st.fragment(run_every=AGENT_POLL_INTERVAL)
+def _poll_agent_job():
+    """Redraw the running agent job every AGENT_POLL_INTERVAL seconds, and the whole app once it finishes."""
+    job = st.session_state.agent_job
+    if job.done:
+        # Tools may have changed Drive, so let every tab redraw
+        st.rerun()
+    _show_agent_job(job)
+
+@st.cache_resource
+def get_llm():
+    """Return the chat model behind the Drive Agent tab, created once per server process."""
+    return ChatOllama(model=LLM_MODEL)
+
+async def run_in_thread(func, *args, **kwargs):
+    """asyncio.to_thread for functions that need the Streamlit script context (session state, caches)."""
+    ctx = get_script_run_ctx()
+    
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args, **kwargs)
+    
+    return await asyncio.to_thread(run)
+
+async def run_tool_batch(tools_by_name, invocations, max_workers=DRIVE_WORKERS):
+    """
+    Run several agent tool invocations concurrently.
+    
+    Args:
+        tools_by_name: Dict mapping tool names to LangChain tools
+        invocations: List of {"tool_name": ..., "arguments": {...}} dicts
+        max_workers: Number of invocations run at the same time
+        
+    Returns:
+        List of the invocations' results, in order
+    """
+    semaphore = asyncio.Semaphore(max_workers)
+    
+    async def run(invocation):
+        tool_name = invocation.get('tool_name')
+        tool = tools_by_name.get(tool_name)
+        if tool is None:
+            return f"Error: unknown tool '{tool_name}'"
+        try:
+            async with semaphore:
+                return await tool.ainvoke(invocation.get('arguments', {}))
+        except Exception as e:
+            return f"Error running {tool_name}: {str(e)}"
+    
+    return await asyncio.gather(*[run(invocation) for invocation in invocations])
+
+def _async_client(creds):
+    """Return this session's AsyncDriveClient, creating it on first use rather than for every operation."""
+    if 'async_client' not in st.session_state:
+        st.session_state.async_client = AsyncDriveClient(creds, limiter)
+    return st.session_state.async_client
 
 def main():
     st.title("Google Drive File Manager")
@@ -519,7 +1639,19 @@ def main():
                 creds, token_info = authenticate()
                 st.session_state.creds = creds
                 st.session_state.token_info = token_info
-                st.session_state.service = build('drive', 'v3', credentials=creds)
+                # Built once here so the Create Folder tab doesn't re-read the credentials on every submit
+                st.session_state.token_display = {
+                    "access_token": creds.token,
+                    "refresh_token": creds.refresh_token
+                }
+                st.session_state.full_token_info = {
+                    "token": creds.token,
+                    "refresh_token": creds.refresh_token,
+                    "token_uri": creds.token_uri,
+                    "client_id": creds.client_id,
+                    "expiry": str(creds.expiry)
+                }
+                st.session_state.service = get_drive_service(creds)
                 st.success("Authentication successful!")
         except Exception as e:
             st.error(f"Authentication failed: {str(e)}")
@@ -528,46 +1660,39 @@ def main():
                 st.experimental_rerun()
     
     if 'service' in st.session_state:
+        # Look these up once per run instead of on every use below
+        service = st.session_state.service
+        creds = st.session_state.creds
+        
         tab1, tab2, tab3, tab4, tab5 = st.tabs(["Create Folder", "Delete Item", "Move File", "View File", "Drive Agent"])
         
         # Tab 1: Create folder (original functionality)
         with tab1:
             st.write("Create a new folder in your Google Drive")
             with st.form("folder_form"):
-                folder_name = st.text_input("Enter the name for your new folder")
+                folder_name = st.text_input("Enter the name for your new folder (or a path such as '/Projects/New Folder')")
                 submit_button = st.form_submit_button("Create Folder")
                 
                 if submit_button:
                     try:
-                        print(f"Starting folder creation process for: '{folder_name}'")
+                        logger.debug("Starting folder creation process for '%s'", folder_name)
                         with st.spinner("Creating folder..."):
-                            folder_id = create_folder(st.session_state.service, folder_name)
+                            folder_id = create_folder_at_path(service, folder_name)
                         
-                        print("Folder creation successful")
                         st.success(f"Folder '{folder_name}' created successfully!")
                         st.write(f"Folder ID: {folder_id}")
                         
                         # Display token information
-                        if hasattr(st.session_state.creds, 'token'):
+                        if 'full_token_info' in st.session_state:
                             st.subheader("OAuth Tokens")
-                            token_info = {
-                                "access_token": st.session_state.creds.token,
-                                "refresh_token": st.session_state.creds.refresh_token
-                            }
-                            st.json(token_info)
+                            st.json(st.session_state.token_display)
                             
                             # Expandable section for all token information
                             with st.expander("View all token information"):
-                                st.json({
-                                    "token": st.session_state.creds.token,
-                                    "refresh_token": st.session_state.creds.refresh_token,
-                                    "token_uri": st.session_state.creds.token_uri,
-                                    "client_id": st.session_state.creds.client_id,
-                                    "expiry": str(st.session_state.creds.expiry)
-                                })
+                                st.json(st.session_state.full_token_info)
                         
                     except Exception as e:
-                        print(f"Error occurred: {str(e)}")
+                        logger.exception("Error creating folder '%s'", folder_name)
                         st.error(f"An error occurred: {str(e)}")
         
         # Tab 2: Delete file or folder
@@ -583,12 +1708,16 @@ def main():
                 elif is_folder_radio == "File":
                     is_folder = False
                 
+                # The async backend is only available when aiohttp is installed
+                use_async = AsyncDriveClient is not None and st.checkbox("Delete folder contents with concurrent requests")
+                
                 delete_button = st.form_submit_button("Delete")
                 
                 if delete_button and path:
                     try:
                         with st.spinner(f"Deleting {path}..."):
-                            delete_by_path(st.session_state.service, path, is_folder)
+                            async_client = _async_client(creds) if use_async else None
+                            delete_by_path(service, path, is_folder, async_client=async_client)
                         
                         st.success(f"Successfully deleted: {path}")
                         
@@ -599,11 +1728,14 @@ def main():
     with tab3:
         st.header("Move Files")
         folder_path_to_list = st.text_input("Enter folder path to list files from (leave empty for root)", value="/")
+        max_results = st.number_input("Max results", min_value=1, value=1000, step=100)
     
         if st.button("List Files"):
             try:
                 with st.spinner(f"Listing files from {folder_path_to_list}..."):
-                    st.session_state.files = list_files(st.session_state.service, folder_path=folder_path_to_list)
+                    st.session_state.files = list_files(service, folder_path=folder_path_to_list, max_results=max_results, fields=MOVE_LIST_FIELDS)
+                    # Remember which folder was listed; the path box may be edited afterwards
+                    st.session_state.listed_folder_id = find_id_by_path(service, folder_path_to_list)
                     st.success(f"Found {len(st.session_state.files)} files/folders")
             except Exception as e:
                 st.error(f"Error listing files: {str(e)}")
@@ -612,18 +1744,17 @@ def main():
             st.info("Please list files first using the button above.")
         else:
             # Display the files that were found
-            import pandas as pd
-            file_data = []
-            for file in st.session_state.files:
-                file_type = "Folder" if file.get("mimeType") == "application/vnd.google-apps.folder" else "File"
-                file_data.append({
-                    "Name": file.get("name", ""),
-                    "Type": file_type,
-                    "ID": file.get("id", ""),
-                    "Modified": file.get("modifiedTime", "")
-                })
+            rows = [
+                (
+                    file.get("name", ""),
+                    "Folder" if file.get("mimeType") == "application/vnd.google-apps.folder" else "File",
+                    file.get("id", ""),
+                    file.get("modifiedTime", "")
+                )
+                for file in st.session_state.files
+            ]
             
-            st.dataframe(pd.DataFrame(file_data), use_container_width=True)
+            st.dataframe(pd.DataFrame.from_records(rows, columns=["Name", "Type", "ID", "Modified"]), use_container_width=True)
             
             # Select file to move
             file_options = [(file.get("name"), file.get("id")) for file in st.session_state.files]
@@ -632,7 +1763,8 @@ def main():
                 options=[name for name, _ in file_options],
                 format_func=lambda x: x
             )
-            file_id = next((id for name, id in file_options if name == selected_file_name), None)
+            selected_file = next((file for file in st.session_state.files if file.get("name") == selected_file_name), None)
+            file_id = selected_file.get("id") if selected_file else None
             
             # Select destination folder by path
             dest_folder_path = st.text_input("Enter destination folder path (e.g., '/My Folder')")
@@ -641,14 +1773,17 @@ def main():
                 with st.spinner(f"Moving file to {dest_folder_path}..."):
                     try:
                         # Find the folder ID from the path
-                        folder_id = find_id_by_path(st.session_state.service, dest_folder_path)
+                        folder_id = find_id_by_path(service, dest_folder_path)
                         
-                        # Move the file
-                        updated_file = move_file(st.session_state.service, file_id, folder_id)
+                        # Move the file, reusing the parents we already got from the listing
+                        previous_parents = ",".join(selected_file.get("parents", []))
+                        updated_file = move_file(service, file_id, folder_id, previous_parents)
                         st.success(f"File '{selected_file_name}' moved successfully to {dest_folder_path}!")
                         
-                        # Refresh the file list
-                        st.session_state.files = list_files(st.session_state.service, folder_path=folder_path_to_list)
+                        # Refresh the file list locally: the moved file has left the listed folder,
+                        # unless it was moved into that same folder
+                        if folder_id != st.session_state.get('listed_folder_id'):
+                            st.session_state.files = [file for file in st.session_state.files if file.get("id") != file_id]
                     except Exception as e:
                         st.error(f"Error moving file: {str(e)}")
 
@@ -661,32 +1796,12 @@ def main():
         if st.button("View File Content") and file_path:
             try:
                 with st.spinner(f"Downloading content of {file_path}..."):
-                    content = get_file_content(st.session_state.service, file_path)
-                    save_file_to_documents(content, "hello.txt")
-                    # Try to detect content type
                     # Get proper file name from path
                     file_name = file_path.strip('/').split('/')[-1]
                     
-                    # Save the file with its proper name
-                    saved_path = save_file_to_documents(content, file_name)
+                    saved_path = download_to_documents(service, file_path, file_name)
                     st.success(f"File saved locally to: {saved_path}")
-                    try:
-                        # For text files
-                        text_content = content.decode("utf-8")
-                        st.text_area("File Content", text_content, height=300)
-                    except UnicodeDecodeError:
-                        # For binary files (like images)
-                        st.write("Binary file detected.")
-                        
-                        # Get file name from path
-                        file_name = file_path.strip('/').split('/')[-1]
-                        
-                        # Check if it might be an image
-                        if any(extension in file_name.lower() for extension in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']):
-                            st.image(content)
-                        
-                        # Provide download option
-                        st.download_button("Download File", content, file_name=file_name)
+                    display_saved_file(saved_path, file_name)
             except Exception as e:
                 st.error(f"Error downloading file: {str(e)}")
                 st.write("Make sure the file path is correct and the file exists.")
@@ -698,7 +1813,7 @@ def main():
         if st.button("Browse Files"):
             try:
                 with st.spinner(f"Listing files from {folder_to_browse}..."):
-                    browse_files = list_files(st.session_state.service, folder_path=folder_to_browse)
+                    browse_files = list_files(service, folder_path=folder_to_browse, fields=BROWSE_LIST_FIELDS)
                     st.session_state.browse_files = browse_files
             except Exception as e:
                 st.error(f"Error browsing files: {str(e)}")
@@ -717,32 +1832,24 @@ def main():
                     format_func=lambda x: x
                 )
                 selected_path = f"{folder_to_browse.rstrip('/')}/{selected_file_name}"
+                selected_file = next(file for file in st.session_state.browse_files if file.get("name") == selected_file_name)
                 
                 if st.button("View Selected File"):
                     try:
                         with st.spinner(f"Downloading content of {selected_path}..."):
-                            content = get_file_content(st.session_state.service, selected_path)
-                            # Get proper file name from path
-                            file_name = file_path.strip('/').split('/')[-1]
-                            
-                            # Save the file with its proper name
-                            saved_path = save_file_to_documents(content, file_name)
+                            # Reuse the ID, type and version from the listing
+                            saved_path = download_to_documents(
+                                service,
+                                selected_path,
+                                selected_file_name,
+                                file_id=selected_file.get("id"),
+                                known_mime_type=selected_file.get("mimeType"),
+                                size=selected_file.get("size"),
+                                modified_time=selected_file.get("modifiedTime"),
+                                async_client=_async_client(creds) if AsyncDriveClient is not None else None
+                            )
                             st.success(f"File saved locally to: {saved_path}")
-                            # Try to detect content type
-                            try:
-                                # For text files
-                                text_content = content.decode("utf-8")
-                                st.text_area("File Content", text_content, height=300)
-                            except UnicodeDecodeError:
-                                # For binary files (like images)
-                                st.write("Binary file detected.")
-                                
-                                # Check if it might be an image
-                                if any(extension in selected_file_name.lower() for extension in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']):
-                                    st.image(content)
-                                
-                                # Provide download option
-                                st.download_button("Download File", content, file_name=selected_file_name)
+                            display_saved_file(saved_path, selected_file_name)
                     except Exception as e:
                         st.error(f"Error downloading file: {str(e)}")
     #AGENT MODEL
@@ -750,17 +1857,22 @@ def main():
         st.header("Drive Agent - Ask or Restructure")
 
         query = st.text_input("What would you like to do? (e.g., 'Move all images to /Photos')")
+        
+        # Every widget in every tab reruns the script, so only start the agent for a new query
+        job = st.session_state.get('agent_job')
+        start_agent = bool(query) and (job is None or job.query != query)
+        if start_agent and job is not None and not job.done:
+            st.warning("Still working on the previous request; this one starts once it has finished.")
+            start_agent = False
 
-        if query:
+        if start_agent:
             try:
-                # Initialize the LLM
-                llm = OllamaLLM(model="llama3.2:3b")
+                # Shared LLM client (a chat model, so the agent can use native tool calling)
+                llm = get_llm()
                 
                 # Create custom tools wrapping our Google Drive functions
-                from langchain.tools import BaseTool, StructuredTool, tool
-                
                 @tool
-                def create_drive_folder(folder_name, parent_path=None):
+                async def create_drive_folder(folder_name, parent_path=None):
                     """Create a new folder in Google Drive.
                     
                     Args:
@@ -776,19 +1888,22 @@ def main():
                     
                     if parent_path:
                         try:
-                            parent_id = find_id_by_path(service, parent_path)
+                            parent_id = await run_in_thread(find_id_by_path, service, parent_path)
                         except FileNotFoundError:
                             return f"Error: Parent folder '{parent_path}' not found."
+                        except ValueError as e:
+                            # Several folders share a name on the way; let the model disambiguate
+                            return f"Error resolving parent folder '{parent_path}': {str(e)}"
                     
                     try:
-                        folder_id = create_folder(service, folder_name, parent_id)
+                        folder_id = await run_in_thread(create_folder, service, folder_name, parent_id)
                         path = f"{parent_path or '/'}{'' if parent_path and parent_path.endswith('/') else '/'}{folder_name}"
                         return f"Created folder '{folder_name}' at path '{path}' with ID: {folder_id}"
                     except Exception as e:
                         return f"Error creating folder: {str(e)}"
                 
                 @tool
-                def list_drive_files(folder_path="/"):
+                async def list_drive_files(folder_path="/"):
                     """List files and folders at the specified path in Google Drive.
                     
                     Args:
@@ -799,7 +1914,7 @@ def main():
                     """
                     service = st.session_state.service
                     try:
-                        files = list_files(service, folder_path=folder_path)
+                        files = await run_in_thread(list_files, service, folder_path=folder_path)
                         result = []
                         for file in files:
                             file_type = "Folder" if file.get("mimeType") == "application/vnd.google-apps.folder" else "File"
@@ -814,7 +1929,7 @@ def main():
                         return f"Error listing files: {str(e)}"
                 
                 @tool
-                def move_drive_file(file_path, destination_folder_path):
+                async def move_drive_file(file_path, destination_folder_path):
                     """Move a file or folder to another location in Google Drive.
                     
                     Args:
@@ -826,15 +1941,20 @@ def main():
                     """
                     service = st.session_state.service
                     try:
-                        file_id = find_id_by_path(service, file_path)
-                        folder_id = find_id_by_path(service, destination_folder_path)
-                        move_file(service, file_id, folder_id)
+                        # Resolve the file and the destination at the same time, mostly from the
+                        # path cache. The folder in the path is the parent the file is moved out
+                        # of, which saves move_file a files.get
+                        (parent_id, file_id), folder_id = await asyncio.gather(
+                            run_in_thread(resolve_with_parent, service, file_path),
+                            run_in_thread(find_id_by_path, service, destination_folder_path)
+                        )
+                        await run_in_thread(move_file, service, file_id, folder_id, parent_id)
                         return f"Successfully moved '{file_path}' to '{destination_folder_path}'"
                     except Exception as e:
                         return f"Error moving file: {str(e)}"
                 
                 @tool
-                def delete_drive_item(path):
+                async def delete_drive_item(path):
                     """Delete a file or folder from Google Drive.
                     
                     Args:
@@ -845,13 +1965,13 @@ def main():
                     """
                     service = st.session_state.service
                     try:
-                        delete_by_path(service, path)
+                        await run_in_thread(delete_by_path, service, path)
                         return f"Successfully deleted '{path}'"
                     except Exception as e:
                         return f"Error deleting item: {str(e)}"
                 
                 @tool
-                def view_file_content(file_path):
+                async def view_file_content(file_path):
                     """View the content of a file from Google Drive.
                     
                     Args:
@@ -862,10 +1982,21 @@ def main():
                     """
                     service = st.session_state.service
                     try:
-                        content = get_file_content(service, file_path)
+                        # The path lookup tells us the type, so media files are refused before downloading
+                        file_id, mime_type = await run_in_thread(resolve_path, service, file_path)
+                        if mime_type == 'application/vnd.google-apps.folder':
+                            return f"'{file_path}' is a folder."
+                        if mime_type.startswith(BINARY_MIME_PREFIXES):
+                            return f"'{file_path}' is not a text file."
+                        
+                        # Only the start of the file is shown, so download just the first chunk
+                        chunks = get_file_content_stream(
+                            service, file_path, chunk_size=AGENT_PREVIEW_BYTES, known_mime_type=mime_type, file_id=file_id
+                        )
+                        content = await run_in_thread(next, chunks, b'')
                         try:
-                            # Try to decode as text
-                            text_content = content.decode('utf-8')
+                            # Try to decode as text, ignoring a character cut in half at the end of the chunk
+                            text_content = codecs.getincrementaldecoder('utf-8')().decode(content)
                             # Limit content length to avoid overwhelming the LLM
                             if len(text_content) > 2000:
                                 text_content = text_content[:1997] + "..."
@@ -875,101 +2006,111 @@ def main():
                     except Exception as e:
                         return f"Error viewing file: {str(e)}"
                 
+                @tool
+                async def batch_drive_ops(operations: list) -> str:
+                    """Move or delete many files and folders in one step.
+                    
+                    Args:
+                        operations: List of {"action": "move" or "delete", "path": ..., "dest": ...} objects;
+                            dest is the destination folder path and is only needed for moves
+                        
+                    Returns:
+                        The outcome of every operation
+                    """
+                    service = st.session_state.service
+                    try:
+                        results = await run_in_thread(run_drive_ops, service, operations)
+                    except Exception as e:
+                        return f"Error running operations: {str(e)}"
+                    return "\n".join(
+                        f"{path}: {'done' if error is None else f'error: {error}'}" for path, error in results.items()
+                    )
+                
+                @tool
+                async def plan_then_execute(folder_path: str, action: str, name_pattern: str = "*",
+                                            file_type: str = "any", destination: str = None) -> str:
+                    """Move or delete every item in a folder that matches a filter, in one step.
+                    
+                    Args:
+                        folder_path: Folder to look in
+                        action: "move" or "delete"
+                        name_pattern: Pattern the names must match, e.g. "*.jpg" or "report*" (default: every name)
+                        file_type: One of any, file, folder, image, video, audio, pdf, text, document, spreadsheet
+                        destination: Destination folder path, needed when action is "move"
+                        
+                    Returns:
+                        The outcome for every matching item
+                    """
+                    service = st.session_state.service
+                    try:
+                        results = await run_in_thread(
+                            run_filtered_op, service, folder_path, action, name_pattern, file_type, destination
+                        )
+                    except Exception as e:
+                        return f"Error running {action}: {str(e)}"
+                    if not results:
+                        return f"Nothing in '{folder_path}' matches the filter."
+                    return "\n".join(
+                        f"{name}: {'done' if error is None else f'error: {error}'}" for name, error in results
+                    )
+                
+                @tool
+                async def batch(invocations: list) -> str:
+                    """Run several of the other tools at once, e.g. to move or delete many files in one step.
+                    
+                    Args:
+                        invocations: List of {"tool_name": ..., "arguments": {...}} objects, one per tool call
+                        
+                    Returns:
+                        The result of every invocation, in order
+                    """
+                    results = await run_tool_batch(tools_by_name, invocations)
+                    return "\n".join(f"{i}. {result}" for i, result in enumerate(results, 1))
+                
                 # Create a list of all tools
-                tools = [
+                drive_tools = [
                     create_drive_folder,
                     list_drive_files,
                     move_drive_file, 
                     delete_drive_item,
-                    view_file_content
+                    view_file_content,
+                    batch_drive_ops,
+                    plan_then_execute
                 ]
+                tools_by_name = {drive_tool.name: drive_tool for drive_tool in drive_tools}
+                tools = drive_tools + [batch]
 
-                # Initialize the agent with our tools
-                agent = initialize_agent(
-                    llm=llm,
+                # Initialize a tool-calling agent with our tools
+                prompt = ChatPromptTemplate.from_messages([
+                    ("system", AGENT_SYSTEM_PROMPT),
+                    ("human", "{input}"),
+                    MessagesPlaceholder("agent_scratchpad")
+                ])
+                agent = AgentExecutor(
+                    agent=create_tool_calling_agent(llm, tools, prompt),
                     tools=tools,
-                    agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,  # Changed agent type
                     verbose=True,
                     handle_parsing_errors=True
                 )
 
-                # Run the agent with proper tool execution tracking
-                with st.spinner("Thinking..."):
-                    try:
-                        # Debug information to track execution
-                        st.write("Starting agent execution...")
-                        
-                        # Create a special callback handler to log tool execution
-                        from langchain.callbacks.base import BaseCallbackHandler
-                        
-                        class ToolExecutionHandler(BaseCallbackHandler):
-                            def on_tool_start(self, serialized, input_str, **kwargs):
-                                tool_name = serialized.get("name", "unknown")
-                                st.write(f"🔧 Executing tool: {tool_name} with input: {input_str}")
-                                
-                            def on_tool_end(self, output, **kwargs):
-                                st.write(f"✅ Tool execution result: {output[:100]}...")
-                                
-                            def on_tool_error(self, error, **kwargs):
-                                st.write(f"❌ Tool execution error: {str(error)}")
-                        
-                        # Explicitly configure the agent to run with our handler
-                        custom_handler = ToolExecutionHandler()
-                        
-                        # Run the agent with explicit callbacks
-                        response = agent.run(
-                            query,
-                            callbacks=[custom_handler]
-                        )
-                        
-                    except Exception as e:
-                        st.error(f"Agent execution error: {str(e)}")
-                        import traceback
-                        st.code(traceback.format_exc())
-                        
-                        # Try to recover what the agent was attempting
-                        if "Could not parse LLM output" in str(e):
-                            st.warning("The agent had trouble formatting its response. Let me try once more with simpler instructions.")
-                            
-                            # Simplified retry with more direct instructions
-                            retry_prompt = f"""I need to {query} in Google Drive. Please tell me exactly which 
-                            of these functions to use and with what parameters:
-                            - create_drive_folder(folder_name, parent_path)
-                            - list_drive_files(folder_path)
-                            - move_drive_file(file_path, destination_folder_path)
-                            - delete_drive_item(path)
-                            - view_file_content(file_path)
-                            
-                            Respond with just the function call and parameters."""
-                            
-                            try:
-                                simple_response = llm.invoke(retry_prompt)
-                                st.write("Simplified response:")
-                                st.write(simple_response)
-                                
-                                # Try to manually execute the function based on the response
-                                if "delete_drive_item" in simple_response:
-                                    import re
-                                    path_match = re.search(r'delete_drive_item\(["\']([^"\']+)["\']', simple_response)
-                                    if path_match:
-                                        path = path_match.group(1)
-                                        st.write(f"Executing: delete_drive_item({path})")
-                                        result = delete_drive_item(path)
-                                        st.write(f"Result: {result}")
-                                # Add similar handlers for other functions
-                                
-                            except Exception as retry_error:
-                                st.error(f"Retry failed: {str(retry_error)}")
-                        
-                        response = "I encountered an error while trying to perform this action."
-                
-                st.success("Agent Response:")
-                st.write(response)
+                # Run the agent in the background; the script run ends right away and
+                # _poll_agent_job redraws the progress until the agent is done
+                job = AgentJob(query)
+                thread = threading.Thread(target=run_agent_job, args=(agent, job), daemon=True)
+                add_script_run_ctx(thread, get_script_run_ctx())
+                thread.start()
+                st.session_state.agent_job = job
 
             except Exception as e:
                 st.error(f"Agent error: {str(e)}")
-                import traceback
                 st.code(traceback.format_exc())
+        
+        job = st.session_state.get('agent_job')
+        if job is not None:
+            if job.done:
+                _show_agent_job(job)
+            else:
+                _poll_agent_job()
                             
 if __name__ == '__main__':
     main()
\ No newline at end of file
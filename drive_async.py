@@ -0,0 +1,186 @@
+import asyncio
+import logging
+
+import aiohttp
+from google.auth.transport.requests import Request
+
+from drive_common import PARENTS_PER_QUERY, deletion_order
+from rate_limiter import RATE_LIMIT_REASONS, RETRY_STATUSES, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+
+# Drive REST endpoint for file resources
+FILES_URL = 'https://www.googleapis.com/drive/v3/files'
+
+class AsyncDriveClient:
+    """
+    aiohttp based Drive client for bulk operations, where the blocking
+    googleapiclient would send one request at a time, and for downloads
+    that run on a background event loop.
+    
+    Args:
+        creds: Google OAuth credentials
+        limiter: DriveRateLimiter shared with the synchronous client
+        max_concurrency: Maximum number of requests in flight at once
+        max_retries: How many times a rate limited or failed (5xx) request is retried
+    """
+    
+    def __init__(self, creds, limiter, max_concurrency=8, max_retries=5):
+        self.creds = creds
+        self.limiter = limiter
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+    
+    async def _headers(self):
+        """Return the auth header, refreshing the access token first if it has expired."""
+        if not self.creds.valid:
+            # The refresh is a blocking HTTP call, so keep it off the event loop
+            await asyncio.to_thread(self.creds.refresh, Request())
+        return {'Authorization': f'Bearer {self.creds.token}'}
+    
+    def _retry_delay(self, response, body, attempt):
+        """Return how long to wait before retrying a failed response, or None if it shouldn't be retried."""
+        retryable = response.status in (429, *RETRY_STATUSES) or (
+            response.status == 403 and any(reason in body for reason in RATE_LIMIT_REASONS)
+        )
+        if not retryable or attempt == self.max_retries:
+            return None
+        
+        delay = response.headers.get('Retry-After')
+        return int(delay) if delay and delay.isdigit() else backoff_delay(attempt)
+    
+    async def _request(self, session, semaphore, method, url, **kwargs):
+        """Send one request under the rate limiter, retrying when Drive asks us to slow down or fails with a 5xx.
+        
+        Returns:
+            Decoded JSON body, or None for empty responses
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire_async()
+            async with semaphore:
+                async with session.request(method, url, headers=await self._headers(), **kwargs) as response:
+                    body = await response.read()
+                    delay = self._retry_delay(response, body, attempt)
+                    if delay is None:
+                        response.raise_for_status()
+                        return await response.json() if body else None
+                    status = response.status
+            
+            logger.warning("Drive request failed with %s, retrying in %.1fs (attempt %d/%d)", status, delay, attempt + 1, self.max_retries)
+            await asyncio.sleep(delay)
+    
+    async def _list_children(self, session, semaphore, folder_ids):
+        """List every item directly inside any of folder_ids with one (paged) query."""
+        parents_query = " or ".join(f"'{folder_id}' in parents" for folder_id in folder_ids)
+        params = {
+            'q': f"trashed = false and ({parents_query})",
+            'pageSize': 1000,
+            'fields': 'nextPageToken, files(id, mimeType, parents)'
+        }
+        items = []
+        
+        while True:
+            results = await self._request(session, semaphore, 'GET', FILES_URL, params=params)
+            items.extend(results.get('files', []))
+            
+            page_token = results.get('nextPageToken')
+            if page_token is None:
+                return items
+            params['pageToken'] = page_token
+    
+    async def list_descendants(self, session, semaphore, root_id):
+        """
+        List everything below a folder, one depth at a time, with the queries of
+        each depth running concurrently.
+        
+        Returns:
+            List of levels, each a list of items (id, mimeType, parents); level 0 holds the direct children
+        """
+        levels = []
+        frontier = [root_id]
+        
+        while frontier:
+            groups = [frontier[i:i + PARENTS_PER_QUERY] for i in range(0, len(frontier), PARENTS_PER_QUERY)]
+            pages = await asyncio.gather(*[self._list_children(session, semaphore, group) for group in groups])
+            level = [item for page in pages for item in page]
+            
+            if not level:
+                break
+            levels.append(level)
+            frontier = [item['id'] for item in level if item['mimeType'] == 'application/vnd.google-apps.folder']
+        
+        return levels
+    
+    async def _delete_all(self, session, semaphore, file_ids):
+        """Delete items concurrently; returns a dict of the IDs that failed and their errors."""
+        async def delete(file_id):
+            try:
+                await self._request(session, semaphore, 'DELETE', f'{FILES_URL}/{file_id}')
+            except aiohttp.ClientResponseError as e:
+                # A 404 means the item is already gone, which is what we wanted
+                if e.status != 404:
+                    return file_id, e
+            return file_id, None
+        
+        results = await asyncio.gather(*[delete(file_id) for file_id in file_ids])
+        return {file_id: error for file_id, error in results if error is not None}
+    
+    async def download_file(self, file_id, fh, progress=None, chunk_size=1 << 20):
+        """
+        Stream the content of a regular (non Google Workspace) file into a file object.
+        
+        Args:
+            file_id: ID of the file to download
+            fh: Binary file object to write to
+            progress: (Optional) Called with the number of bytes written so far after every chunk
+            chunk_size: Largest piece read from the response at a time
+        """
+        written = 0
+        async with aiohttp.ClientSession() as session:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire_async()
+                async with session.get(f'{FILES_URL}/{file_id}', params={'alt': 'media'}, headers=await self._headers()) as response:
+                    if response.status < 400:
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            fh.write(chunk)
+                            written += len(chunk)
+                            if progress is not None:
+                                progress(written)
+                        return
+                    
+                    # Rate limited and 5xx responses are retried like every other request
+                    body = await response.read()
+                    delay = self._retry_delay(response, body, attempt)
+                    if delay is None:
+                        response.raise_for_status()
+                    status = response.status
+                
+                logger.warning("Drive download failed with %s, retrying in %.1fs (attempt %d/%d)", status, delay, attempt + 1, self.max_retries)
+                await asyncio.sleep(delay)
+    
+    async def delete_folder(self, folder_id):
+        """
+        Delete a folder and everything in it, overlapping the individual deletes.
+        
+        Args:
+            folder_id: ID of the folder to delete
+            
+        Returns:
+            True once the folder has been deleted
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with aiohttp.ClientSession() as session:
+            # One group at a time, so nothing is deleted before its contents
+            failed = {}
+            for group in deletion_order(await self.list_descendants(session, semaphore, folder_id)):
+                failed.update(await self._delete_all(session, semaphore, group))
+            
+            if failed:
+                for item_id, error in failed.items():
+                    logger.error("Error deleting item %s: %s", item_id, error)
+                raise RuntimeError(f"Failed to delete {len(failed)} item(s) inside folder {folder_id}")
+            
+            await self._request(session, semaphore, 'DELETE', f'{FILES_URL}/{folder_id}')
+        
+        return True
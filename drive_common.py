@@ -0,0 +1,28 @@
+# Folders OR-joined into one "in parents" query when walking a folder tree
+PARENTS_PER_QUERY = 50
+
+def deletion_order(levels):
+    """
+    Group the items of a folder tree into the order they can be deleted in, so no
+    group mixes a folder with its contents: every file first, then the subfolders
+    one depth at a time, deepest first.
+    
+    Args:
+        levels: Items (id, mimeType) below the folder, one list per depth, as returned by list_descendants
+        
+    Returns:
+        List of groups of item IDs; the items within a group can be deleted concurrently
+    """
+    files = []
+    folder_levels = []
+    for level in levels:
+        subfolders = []
+        for item in level:
+            if item['mimeType'] == 'application/vnd.google-apps.folder':
+                subfolders.append(item['id'])
+            else:
+                files.append(item['id'])
+        if subfolders:
+            folder_levels.append(subfolders)
+    
+    return [files] + folder_levels[::-1]
@@ -1,39 +1,109 @@
 from langchain_ollama import OllamaLLM, OllamaEmbeddings
 from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import CharacterTextSplitter
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import TextLoader
 from langchain.chains import RetrievalQA
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain
 
+import json
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from langchain_community.document_loaders import TextLoader, UnstructuredFileLoader
-import os
 
+# Ollama models used for answering (4-bit quantized) and for embedding. Keep LLM_MODEL
+# in step with LLM_MODEL in drive.py
+LLM_MODEL = "llama3.2:3b-instruct-q4_K_M"
+EMBEDDING_MODEL = "nomic-embed-text"
+
+# Where the Chroma index is persisted. Vectors from different embedding models
+# can't be mixed, so each model gets its own collection
+CHROMA_DIR = "./chroma_db"
+COLLECTION_NAME = EMBEDDING_MODEL.replace(":", "-")
+
+# (mtime, size) of every file the collection was last built from
+FINGERPRINT_FILE = os.path.join(CHROMA_DIR, f".{COLLECTION_NAME}.fingerprint")
+
+# Chunks embedded per request to Ollama, and how many of those requests run at once
+EMBED_BATCH_SIZE = 64
+EMBED_WORKERS = 8
+
+# Clients shared by every chain; created on first use by the get_* functions below
+_llm = None
+_embeddings = None
+_vectorstore = None
+_clients_lock = threading.Lock()
+
+def get_llm():
+    """Return the shared OllamaLLM client, creating it on first use."""
+    global _llm
+    with _clients_lock:
+        if _llm is None:
+            _llm = OllamaLLM(model=LLM_MODEL)
+        return _llm
+
+def get_embeddings():
+    """Return the shared OllamaEmbeddings client, creating it on first use."""
+    global _embeddings
+    with _clients_lock:
+        if _embeddings is None:
+            _embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+        return _embeddings
+
+def get_vectorstore():
+    """Return the shared Chroma store persisted in CHROMA_DIR, opening it on first use."""
+    global _vectorstore
+    embeddings = get_embeddings()
+    with _clients_lock:
+        if _vectorstore is None:
+            _vectorstore = Chroma(
+                collection_name=COLLECTION_NAME,
+                persist_directory=CHROMA_DIR,
+                embedding_function=embeddings
+            )
+        return _vectorstore
+
+def _load_one(filename, folder="documents"):
+    """Load one file from the documents folder, tagging every document with its file name.
+    
+    Returns None if the file could not be loaded.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    filepath = os.path.join(folder, filename)
+    try:
+        if ext == ".txt":
+            loader = TextLoader(filepath)
+        else:
+            loader = UnstructuredFileLoader(filepath)
+            
+        loaded_docs = loader.load()
+
+        for doc in loaded_docs:
+            doc.page_content = f"This content is from the file {filename}:\n\n{doc.page_content}"
+            doc.metadata["filename"] = filename
+
+        return loaded_docs
 
-def load_documents():
+    except Exception as e:
+        print(f" Failed to load {filename}: {e}")
+        return None
+
+def load_documents(filenames=None, failed=None):
     docs = []
     folder = "documents"
-    for filename in os.listdir(folder):
-        ext = os.path.splitext(filename)[1].lower()
-        filepath = os.path.join(folder, filename)
-        try:
-            if ext == ".txt":
-                loader = TextLoader(filepath)
-            else:
-                loader = UnstructuredFileLoader(filepath)
-                
-            loaded_docs = loader.load()
-
-            for doc in loaded_docs:
-                doc.page_content = f"This content is from the file {filename}:\n\n{doc.page_content}"
-                doc.metadata["filename"] = filename
-
+    if filenames is None:
+        filenames = os.listdir(folder)
+    # Parsing (PDFs, Office files) is CPU bound, so load the files in separate processes
+    with ProcessPoolExecutor() as executor:
+        for filename, loaded_docs in zip(filenames, executor.map(_load_one, filenames)):
+            if loaded_docs is None:
+                # Let the caller know which files to try again
+                if failed is not None:
+                    failed.append(filename)
+                continue
             docs.extend(loaded_docs)
-
-        except Exception as e:
-            print(f" Failed to load {filename}: {e}")
     
     print(f"Loaded {len(docs)} documents.")
     return docs
@@ -41,27 +111,80 @@ def load_documents():
 
 # Step 2: Split documents
 def split_documents(docs):
-    splitter = CharacterTextSplitter(chunk_size=10, chunk_overlap=1)
+    # Chunks of about a paragraph keep enough context per chunk and the embedding calls few
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
     print("Split docs:")
     
     return splitter.split_documents(docs)
 
 # Step 3: Create vector store
 def create_vectorstore(docs):
-    embeddings = OllamaEmbeddings(model="llama3.2:3b")
-    return Chroma.from_documents(docs, embeddings, persist_directory="./chroma_db")
+    vectorstore = get_vectorstore()
+    # Embedding is mostly waiting on Ollama, so keep several batches in flight
+    batches = [docs[i:i + EMBED_BATCH_SIZE] for i in range(0, len(docs), EMBED_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as executor:
+        list(executor.map(vectorstore.add_documents, batches))
+    return vectorstore
+
+def _fingerprint(folder="documents"):
+    """Return {filename: [mtime, size]} for every file in the documents folder."""
+    fingerprint = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file():
+                stat = entry.stat()
+                fingerprint[entry.name] = [stat.st_mtime, stat.st_size]
+    return fingerprint
+
+def update_index():
+    """
+    Bring the Chroma index up to date with the documents folder, re-embedding only
+    the files that were added or changed since the last run.
+    
+    Returns:
+        The shared vector store
+    """
+    vectorstore = get_vectorstore()
+    current = _fingerprint()
+    try:
+        with open(FINGERPRINT_FILE) as f:
+            indexed = json.load(f)
+    except (OSError, ValueError):
+        indexed = {}
+    
+    changed = [filename for filename, stamp in current.items() if indexed.get(filename) != stamp]
+    stale = [filename for filename in indexed if filename not in current] + [filename for filename in changed if filename in indexed]
+    
+    if not changed and not stale:
+        print("Index is up to date.")
+        return vectorstore
+    
+    # Drop the chunks of files that were removed or are about to be re-indexed
+    for filename in stale:
+        stale_ids = vectorstore.get(where={"filename": filename})["ids"]
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
+    
+    if changed:
+        failed = []
+        create_vectorstore(split_documents(load_documents(changed, failed)))
+        # Leave files that failed to load out of the fingerprint, so the next run retries them
+        for filename in failed:
+            del current[filename]
+    
+    with open(FINGERPRINT_FILE, "w") as f:
+        json.dump(current, f)
+    return vectorstore
 
 # Step 4: Setup QA chain
 def create_qa_chain():
-    llm = OllamaLLM(model="llama3.2:3b")
-    vectorstore = Chroma(persist_directory="./chroma_db", embedding_function=OllamaEmbeddings(model="llama3.2:3b"))
-    retriever = vectorstore.as_retriever()
+    llm = get_llm()
+    retriever = get_vectorstore().as_retriever()
     return RetrievalQA.from_chain_type(llm=llm, retriever=retriever, return_source_documents=True)
 
 def create_chat_chain():
-    llm = OllamaLLM(model="llama3.2:3b")
-    vectorstore = Chroma(persist_directory="./chrom_db", embedding_function=OllamaEmbeddings(model="llama3.2:3b"))
-    retriever = vectorstore.as_retriever()
+    llm = get_llm()
+    retriever = get_vectorstore().as_retriever()
     memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
     return ConversationalRetrievalChain.from_llm(
         llm=llm,
@@ -73,12 +196,7 @@ def create_chat_chain():
 # Main loop
 def generate_summary():
         print("Indexing documents...")
-        docs = load_documents()
-        print(f"Loaded documents: {[doc.metadata for doc in docs]}")
-        split_docs = split_documents(docs)
-        for i, chunk in enumerate(split_docs):
-            print(f"Chunk {i}: {chunk.page_content[:100]}")
-        create_vectorstore(split_docs)
+        update_index()
         qa = create_qa_chain()
         print("\nAnswer:\n", result["result"])
         #summary 
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+
+# Reasons Drive uses when it answers 403 instead of 429 for rate limiting
+RATE_LIMIT_REASONS = (b'rateLimitExceeded', b'userRateLimitExceeded')
+
+# Server errors that are usually gone on the next attempt
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Upper bound in seconds for a single backoff delay
+MAX_BACKOFF = 64
+
+class DriveRateLimiter:
+    """Token bucket plus connection cap for Google Drive API requests.
+    
+    Args:
+        rate: Requests allowed per second (Drive allows ~10 writes/s per user)
+        max_connections: Maximum number of requests in flight at the same time
+        max_retries: How many times a rate limited or failed (5xx) request is retried before giving up
+    """
+    
+    def __init__(self, rate=10, max_connections=8, max_retries=5):
+        self.rate = rate
+        self.max_retries = max_retries
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(max_connections)
+    
+    def _reserve(self, cost):
+        """Take cost tokens from the bucket and return how long to wait before sending.
+        
+        Tokens are reserved up front, so a cost larger than the bucket (e.g. a full
+        batch request) simply waits until the bucket has refilled enough to cover it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= cost
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+    
+    def acquire(self, cost=1):
+        """Block until cost requests may be sent."""
+        wait = self._reserve(cost)
+        if wait:
+            time.sleep(wait)
+    
+    async def acquire_async(self, cost=1):
+        """Wait (without blocking the event loop) until cost requests may be sent."""
+        wait = self._reserve(cost)
+        if wait:
+            await asyncio.sleep(wait)
+    
+    def call(self, request, cost=1, http=None):
+        """Execute a googleapiclient request (or batch request) under the limiter.
+        
+        Args:
+            request: Object with an execute() method, e.g. service.files().list(...)
+            cost: Number of API calls the request counts as
+            http: (Optional) HTTP object to send the request with instead of the service's own
+            
+        Returns:
+            Whatever request.execute() returns
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(cost)
+            with self._semaphore:
+                try:
+                    return request.execute(http=http)
+                except HttpError as e:
+                    if not is_retryable(e) or attempt == self.max_retries:
+                        raise
+                    delay = _retry_after(e)
+                    if delay is None:
+                        delay = backoff_delay(attempt)
+                    status = e.resp.status
+            
+            logger.warning("Drive request failed with %s, retrying in %.1fs (attempt %d/%d)", status, delay, attempt + 1, self.max_retries)
+            time.sleep(delay)
+
+def backoff_delay(attempt):
+    """Exponential backoff with jitter, so retrying clients don't all come back at once."""
+    return min(MAX_BACKOFF, 2 ** attempt + random.random())
+
+def _is_rate_limited(error):
+    """Check whether an HttpError is Drive telling us to slow down."""
+    if error.resp.status == 429:
+        return True
+    content = error.content or b''
+    return error.resp.status == 403 and any(reason in content for reason in RATE_LIMIT_REASONS)
+
+def is_retryable(error):
+    """Check whether an HttpError is worth retrying."""
+    return _is_rate_limited(error) or error.resp.status in RETRY_STATUSES
+
+def _retry_after(error):
+    """Return the Retry-After delay in seconds, or None if the header is missing."""
+    value = error.resp.get('retry-after')
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None